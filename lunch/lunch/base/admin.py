@@ -1,3 +1,47 @@
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
 
-# Register your models here.
+
+class RelatedIDListFilter(admin.FieldListFilter):
+    """Filter a foreign key by a typed-in primary key.
+
+    RelatedFieldListFilter loads and lists every related object on each
+    changelist request; this loads none. Takes the same query parameter,
+    e.g. ``store__id__exact``.
+    """
+
+    template = 'admin/related_id_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin,
+                 field_path):
+        self.lookup_kwarg = '{}__{}__exact'.format(
+            field_path, field.rel.to._meta.pk.name,
+        )
+        super().__init__(
+            field, request, params, model, model_admin, field_path,
+        )
+        self.lookup_val = request.GET.get(self.lookup_kwarg, '')
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def queryset(self, request, queryset):
+        try:
+            return super().queryset(request, queryset)
+        except ValueError as e:
+            # Typed in, so it may not be a number at all.
+            raise IncorrectLookupParameters(e)
+
+    def choices(self, cl):
+        yield {
+            'name': self.lookup_kwarg,
+            'value': self.lookup_val,
+            # Keep the other filters and the search when submitting.
+            'params': [
+                (name, value) for name, value in cl.params.items()
+                if name != self.lookup_kwarg
+            ],
+            'all_query_string': cl.get_query_string(
+                remove=[self.lookup_kwarg],
+            ),
+        }
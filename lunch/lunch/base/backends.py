@@ -0,0 +1,40 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .db.routers import use_primary
+
+
+PERMISSIONS_CACHE_KEY = 'auth:permissions:{pk}'
+
+
+def get_permissions_cache_key(pk):
+    return PERMISSIONS_CACHE_KEY.format(pk=pk)
+
+
+def invalidate_permissions(user_pks):
+    cache.delete_many([get_permissions_cache_key(pk) for pk in user_pks])
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that keeps each user's permission set in the cache.
+
+    The set is invalidated by receivers in base.models when the user is
+    saved (e.g. no longer a superuser), or the user's groups or permissions,
+    or a group's permissions, change.
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if (not user_obj.is_active or user_obj.is_anonymous() or
+                obj is not None):
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            key = get_permissions_cache_key(user_obj.pk)
+            permissions = cache.get(key)
+            if permissions is None:
+                # Cached until the next change, so do not risk a stale
+                # replica.
+                with use_primary():
+                    permissions = super().get_all_permissions(user_obj)
+                cache.set(key, permissions, None)
+            user_obj._perm_cache = permissions
+        return user_obj._perm_cache
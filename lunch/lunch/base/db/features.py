@@ -0,0 +1,15 @@
+"""Checks for SQL features that Django's backends do not describe."""
+
+
+def can_return_rows(connection):
+    """Return whether INSERT and UPDATE on ``connection`` take RETURNING.
+
+    PostgreSQL does; SQLite only since 3.35, which Python builds older than
+    that do not link. ``INSERT ... ON CONFLICT`` (SQLite 3.24) is implied.
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    return (
+        connection.vendor == 'sqlite' and
+        connection.Database.sqlite_version_info >= (3, 35, 0)
+    )
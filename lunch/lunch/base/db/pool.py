@@ -0,0 +1,100 @@
+import threading
+import time
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool(object):
+    """A blocking pool of psycopg2 connections shared by threads.
+
+    ``connect`` is called to open a connection when none is idle and fewer
+    than ``max_size`` are open; otherwise ``get()`` waits up to ``timeout``
+    seconds for one to be returned. Idle connections are checked with a
+    ``SELECT 1`` before they are handed out again.
+
+    Uses ``threading`` only, so it works with gevent's monkey-patching too.
+    """
+
+    def __init__(self, connect, max_size=10, timeout=30):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.size = 0
+        self.idle = []
+        self.condition = threading.Condition()
+
+    def get(self):
+        deadline = time.time() + self.timeout
+        while True:
+            with self.condition:
+                while not self.idle and self.size >= self.max_size:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            'No connection available within {} seconds.'
+                            .format(self.timeout)
+                        )
+                    self.condition.wait(remaining)
+                if self.idle:
+                    conn = self.idle.pop()
+                else:
+                    self.size += 1
+                    conn = None
+            if conn is None:
+                try:
+                    return self.connect()
+                except Exception:
+                    self.discard()
+                    raise
+            if self.is_usable(conn):
+                return conn
+            self.discard(conn)
+
+    def put(self, conn):
+        """Return a connection, rolling back anything left uncommitted."""
+        try:
+            if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            usable = (
+                conn.get_transaction_status() == TRANSACTION_STATUS_IDLE
+            )
+        except Exception:
+            usable = False
+        if conn.closed or not usable:
+            self.discard(conn)
+            return
+        with self.condition:
+            # Most recently used first, so surplus connections go idle.
+            self.idle.append(conn)
+            self.condition.notify()
+
+    def discard(self, conn=None):
+        """Give up a connection's slot, closing it if it is still open."""
+        if conn is not None and not conn.closed:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    def close(self):
+        with self.condition:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            self.discard(conn)
+
+    def is_usable(self, conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception:
+            return False
+        return True
@@ -0,0 +1,69 @@
+"""PostgreSQL backend that takes connections from a pool in each process.
+
+Meant for threaded or gevent workers, where every request runs in a new
+thread or greenlet and would otherwise open its own connection. Set
+``CONN_MAX_AGE`` to 0 so connections go back to the pool after each
+request, and size the pool with ``OPTIONS['pool']``::
+
+    'ENGINE': 'base.db.postgresql_pool',
+    'CONN_MAX_AGE': 0,
+    'OPTIONS': {'pool': {'max_size': 10, 'timeout': 30}},
+"""
+import threading
+
+from django.db.backends.postgresql_psycopg2 import base
+
+from ..pool import ConnectionPool
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(conn_params, options):
+    # Keyed by connection parameters, so the test database gets a pool of
+    # its own.
+    key = tuple(sorted(conn_params.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(
+                lambda: base.Database.connect(**conn_params), **options
+            )
+    return pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def get_pool(self):
+        return get_pool(
+            self.get_connection_params(),
+            self.settings_dict['OPTIONS'].get('pool', {}),
+        )
+
+    def get_new_connection(self, conn_params):
+        connection = self.get_pool().get()
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.in_atomic_block:
+            # Django keeps referring to the connection until the block
+            # exits, so it must not be handed to another thread.
+            self.get_pool().discard(self.connection)
+            return
+        self.get_pool().put(self.connection)
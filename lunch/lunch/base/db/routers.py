@@ -0,0 +1,63 @@
+"""Send reads to replicas, and writes to the primary (``default``).
+
+Replicas lag behind the primary, so a request that writes, and requests of
+the same client shortly afterwards, read from the primary too (see
+``base.middleware.ReadYourWritesMiddleware``). Wrap reads whose results
+are cached until the next write in ``use_primary()``, or a stale result
+could outlive the lag.
+"""
+import contextlib
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+_state = threading.local()
+
+
+def is_primary_pinned():
+    return getattr(_state, 'pinned', 0) > 0
+
+
+def pin_primary():
+    _state.pinned = getattr(_state, 'pinned', 0) + 1
+
+
+def unpin_primary():
+    _state.pinned = max(getattr(_state, 'pinned', 0) - 1, 0)
+
+
+@contextlib.contextmanager
+def use_primary():
+    """Read from the primary inside the block."""
+    pin_primary()
+    try:
+        yield
+    finally:
+        unpin_primary()
+
+
+class ReplicaRouter(object):
+    """Route reads to a random database in ``DATABASE_REPLICAS``.
+
+    Reads go to the primary while it is pinned, and always if there are no
+    replicas.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or is_primary_pinned():
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        databases = (DEFAULT_DB_ALIAS,) + tuple(settings.DATABASE_REPLICAS)
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
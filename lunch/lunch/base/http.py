@@ -0,0 +1,22 @@
+import hashlib
+
+from django.middleware.csrf import get_token
+
+
+def make_etag(*parts):
+    return hashlib.md5(
+        ':'.join(str(part) for part in parts).encode('utf-8'),
+    ).hexdigest()
+
+
+def get_request_etag_parts(request):
+    """Request-specific values that affect a rendered HTML page.
+
+    Pages show the current user, a CSRF token and the active language, so
+    their ETags must change with these as well as with the data.
+    """
+    return (
+        request.user.pk,
+        get_token(request),
+        getattr(request, 'LANGUAGE_CODE', ''),
+    )
@@ -0,0 +1,177 @@
+"""Non-blocking, structured logging.
+
+Request threads only put records on a queue; a background thread formats
+them as JSON lines and writes them to a file in batches.
+
+Every worker process writes to the same file, so none of them rotates it;
+that is left to logrotate (see lunch/deploy/logrotate.conf). Each process
+reopens the file when it finds it was moved.
+"""
+import atexit
+import copy
+import datetime
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+
+
+_exception_formatter = logging.Formatter()
+
+
+class JSONFormatter(logging.Formatter):
+    """Format a record as a single line of JSON."""
+
+    def format(self, record):
+        data = {
+            'time': datetime.datetime.utcfromtimestamp(
+                record.created,
+            ).isoformat() + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'process': record.process,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Let through one in ``every`` records below ``level``.
+
+    Records at ``level`` or above always pass.
+    """
+
+    def __init__(self, every=10, level='ERROR'):
+        super().__init__()
+        self.every = every
+        if isinstance(level, str):
+            level = logging.getLevelName(level)
+        self.level = level
+        self.counter = itertools.count()
+
+    def filter(self, record):
+        if record.levelno >= self.level:
+            return True
+        return next(self.counter) % self.every == 0
+
+
+class BatchWatchedFileHandler(logging.handlers.WatchedFileHandler):
+    """WatchedFileHandler that can write many records with one flush."""
+
+    def close_if_moved(self):
+        # WatchedFileHandler.reopenIfNeeded() is new in Python 3.6.
+        try:
+            stat = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or (stat.st_dev, stat.st_ino) != (self.dev, self.ino):
+            if self.stream is not None:
+                self.stream.flush()
+                self.stream.close()
+                self.stream = None
+
+    def emit_batch(self, records):
+        self.acquire()
+        try:
+            # Checked once per batch rather than once per record.
+            self.close_if_moved()
+            if self.stream is None:
+                self.stream = self._open()
+                self._statstream()
+            for record in records:
+                try:
+                    self.stream.write(self.format(record) + self.terminator)
+                except Exception:
+                    self.handleError(record)
+            self.stream.flush()
+        finally:
+            self.release()
+
+
+class BatchQueueListener(logging.handlers.QueueListener):
+    """QueueListener that hands records to its handlers in batches."""
+
+    def __init__(self, queue, *handlers, batch_size=100):
+        super().__init__(queue, *handlers)
+        self.batch_size = batch_size
+
+    def handle_batch(self, records):
+        for handler in self.handlers:
+            records_for_handler = [
+                record for record in records
+                if record.levelno >= handler.level and handler.filter(record)
+            ]
+            if not records_for_handler:
+                continue
+            if hasattr(handler, 'emit_batch'):
+                handler.emit_batch(records_for_handler)
+            else:
+                for record in records_for_handler:
+                    handler.handle(record)
+
+    def _monitor(self):
+        done = False
+        while not done:
+            record = self.dequeue(True)
+            if record is self._sentinel:
+                break
+            batch = [record]
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.dequeue(False)
+                except queue.Empty:
+                    break
+                if record is self._sentinel:
+                    done = True
+                    break
+                batch.append(record)
+            self.handle_batch(batch)
+
+
+class AsyncFileHandler(logging.handlers.QueueHandler):
+    """Queue records for a background thread that writes JSON lines.
+
+    Takes the arguments of WatchedFileHandler, plus ``batch_size``, the
+    most records written per flush. The listener thread is started on
+    creation and flushed when the interpreter exits.
+    """
+
+    def __init__(self, filename, encoding='utf-8', batch_size=100):
+        super().__init__(queue.Queue())
+        self.target = BatchWatchedFileHandler(
+            filename, encoding=encoding, delay=True,
+        )
+        self.target.setFormatter(JSONFormatter())
+        self.listener = BatchQueueListener(
+            self.queue, self.target, batch_size=batch_size,
+        )
+        self.listener.start()
+        atexit.register(self.close)
+
+    def prepare(self, record):
+        # Only resolve what may change after the call returns; formatting
+        # into JSON happens on the listener thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(
+                record.exc_info,
+            )
+            record.exc_info = None
+        return record
+
+    def close(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+            self.target.close()
+        super().close()
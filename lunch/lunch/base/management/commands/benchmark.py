@@ -0,0 +1,171 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from events.models import Event
+from stores.models import Store
+from .generate_data import PASSWORD
+
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, int(round(p / 100 * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+
+def get_endpoints():
+    """Return ``(name, url, login_required)`` for each benchmarked page."""
+    store = Store.objects.order_by('-updated_at').first()
+    event = Event.objects.order_by('-pk').first()
+    endpoints = [
+        ('home', reverse('home'), False),
+        ('store_list', reverse('store_list'), False),
+        ('api_v1_store_list', '/api/v1/store/', False),
+        ('api_v2_store_list', '/api/v2/store/', False),
+    ]
+    if store is not None:
+        endpoints += [
+            ('store_detail', store.get_absolute_url(), False),
+            ('store_update',
+             reverse('store_update', kwargs={'pk': store.pk}), False),
+        ]
+    if event is not None:
+        endpoints.append(('event_detail', event.get_absolute_url(), True))
+    return endpoints
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure latency percentiles and query counts of the main pages and '
+        'APIs against the current database, optionally comparing them with '
+        'a stored baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Measured requests per endpoint (default 20).',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=2,
+            help='Unmeasured requests per endpoint first (default 2).',
+        )
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Host header to send; must be in ALLOWED_HOSTS.',
+        )
+        parser.add_argument(
+            '--username', default='bench-0',
+            help='User to log in as for pages that require it.',
+        )
+        parser.add_argument('--password', default=PASSWORD)
+        parser.add_argument(
+            '--logged-in', action='store_true',
+            help='Request every page as the logged-in user.',
+        )
+        parser.add_argument(
+            '--save', metavar='PATH', help='Write the results to PATH.',
+        )
+        parser.add_argument(
+            '--baseline', metavar='PATH',
+            help='Compare the results with those stored in PATH.',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed relative p95 slowdown against the baseline.',
+        )
+
+    def measure(self, client, url, repeat, warmup):
+        for _ in range(warmup):
+            client.get(url)
+        timings = []
+        queries = 0
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise CommandError('{url} returned HTTP {status}.'.format(
+                    url=url, status=response.status_code,
+                ))
+            queries = max(queries, len(captured))
+        timings.sort()
+        result = {'queries': queries}
+        for p in PERCENTILES:
+            result['p{}'.format(p)] = percentile(timings, p)
+        return result
+
+    def compare(self, results, baseline, tolerance):
+        regressions = []
+        for name, result in sorted(results.items()):
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if result['queries'] > base['queries']:
+                regressions.append('{name}: {old} -> {new} queries'.format(
+                    name=name, old=base['queries'], new=result['queries'],
+                ))
+            if result['p95'] > base['p95'] * (1 + tolerance):
+                regressions.append(
+                    '{name}: p95 {old:.1f} -> {new:.1f} ms'.format(
+                        name=name, old=base['p95'], new=result['p95'],
+                    )
+                )
+        return regressions
+
+    def handle(self, *args, **options):
+        anonymous = Client(HTTP_HOST=options['host'])
+        user = Client(HTTP_HOST=options['host'])
+        logged_in = user.login(
+            username=options['username'], password=options['password'],
+        )
+
+        results = {}
+        for name, url, login_required in get_endpoints():
+            if login_required and not logged_in:
+                self.stderr.write('Skipping {name}: cannot log in.'.format(
+                    name=name,
+                ))
+                continue
+            if options['logged_in'] and not logged_in:
+                raise CommandError('Cannot log in as {username}.'.format(
+                    username=options['username'],
+                ))
+            client = (
+                user if login_required or options['logged_in'] else anonymous
+            )
+            result = self.measure(
+                client, url, options['repeat'], options['warmup'],
+            )
+            results[name] = result
+            self.stdout.write(
+                '{name:20} {queries:3} queries  p50 {p50:7.1f} ms  '
+                'p95 {p95:7.1f} ms  p99 {p99:7.1f} ms'.format(
+                    name=name, **result
+                )
+            )
+
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = self.compare(
+                results, baseline, options['tolerance'],
+            )
+            if regressions:
+                raise CommandError(
+                    'Regressions against baseline:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write('No regressions against baseline.')
@@ -0,0 +1,154 @@
+import threading
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+
+from base.db.postgresql_pool import base as pool_backend
+from .benchmark import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare request latency when opening a database connection per '
+        'request, keeping one per thread, and sharing a pool between '
+        'threads. Requests go through the WSGI handler, so connections are '
+        'opened and closed as in production. Needs PostgreSQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/store/')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument(
+            '--threads', type=int, default=4,
+            help='Concurrent request threads, as in a threaded worker.',
+        )
+        parser.add_argument(
+            '--pool-size', type=int, default=2,
+            help='Connections shared by the threads in pooled mode.',
+        )
+        parser.add_argument(
+            '--thread-per-request', action='store_true',
+            help='Serve each request from a new thread, like gevent does.',
+        )
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Host header to send; must be in ALLOWED_HOSTS.',
+        )
+
+    def get_modes(self, database, pool_size):
+        engine = 'django.db.backends.postgresql_psycopg2'
+        options = {
+            key: value for key, value in database.get('OPTIONS', {}).items()
+            if key != 'pool'
+        }
+        return [
+            ('new connection', {
+                'ENGINE': engine, 'CONN_MAX_AGE': 0, 'OPTIONS': options,
+            }),
+            ('persistent', {
+                'ENGINE': engine, 'CONN_MAX_AGE': None,
+                'CONN_HEALTH_CHECKS': True, 'OPTIONS': options,
+            }),
+            ('pool', {
+                'ENGINE': 'base.db.postgresql_pool', 'CONN_MAX_AGE': 0,
+                'OPTIONS': dict(options, pool={'max_size': pool_size}),
+            }),
+        ]
+
+    def run(self, handler, environ, requests, threads, thread_per_request):
+        timings = []
+        errors = []
+        lock = threading.Lock()
+        remaining = iter(range(requests))
+
+        def start_response(status, headers):
+            if not status.startswith('200'):
+                raise CommandError('Got {}.'.format(status))
+
+        def request():
+            try:
+                response = handler(dict(environ), start_response)
+                for chunk in response:
+                    pass
+                response.close()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                if thread_per_request:
+                    connection.close()
+
+        def work():
+            try:
+                while not errors:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    start = time.perf_counter()
+                    if thread_per_request:
+                        thread = threading.Thread(target=request)
+                        thread.start()
+                        thread.join()
+                    else:
+                        request()
+                    with lock:
+                        timings.append((time.perf_counter() - start) * 1000)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        if errors:
+            raise errors[0]
+        timings.sort()
+        return timings, elapsed
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('This benchmark needs PostgreSQL.')
+        database = connections.databases[connection.alias]
+        saved = dict(database)
+        handler = WSGIHandler()
+        environ = RequestFactory(HTTP_HOST=options['host']).get(
+            options['url'],
+        ).environ
+        backends = set()
+
+        def count_connection(connection, **kwargs):
+            # Fired on each checkout from a pool too; count server processes.
+            backends.add(connection.connection.get_backend_pid())
+
+        connection_created.connect(count_connection)
+        try:
+            for name, overrides in self.get_modes(
+                    database, options['pool_size']):
+                # Each request thread creates its connection from these.
+                database.update(overrides)
+                backends.clear()
+                timings, elapsed = self.run(
+                    handler, environ, options['requests'], options['threads'],
+                    options['thread_per_request'],
+                )
+                self.stdout.write(
+                    '{name:15} {rps:7.1f} req/s  p50 {p50:6.2f} ms  '
+                    'p95 {p95:6.2f} ms  {backends} connections'.format(
+                        name=name, rps=len(timings) / elapsed,
+                        p50=percentile(timings, 50),
+                        p95=percentile(timings, 95), backends=len(backends),
+                    )
+                )
+                database.clear()
+                database.update(saved)
+        finally:
+            connection_created.disconnect(count_connection)
+            for pool in pool_backend._pools.values():
+                pool.close()
+            pool_backend._pools.clear()
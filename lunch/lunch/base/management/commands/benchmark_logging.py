@@ -0,0 +1,80 @@
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from base.log import AsyncFileHandler
+from .benchmark import percentile
+
+
+HANDLERS = (
+    ('FileHandler', lambda path: logging.FileHandler(path, encoding='utf-8')),
+    ('AsyncFileHandler', AsyncFileHandler),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare request latency when logging everything at DEBUG level '
+        'through a synchronous FileHandler and through the queue-based '
+        'AsyncFileHandler.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/store/')
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Host header to send; must be in ALLOWED_HOSTS.',
+        )
+
+    def measure(self, handler, url, repeat, host):
+        root = logging.getLogger()
+        db_logger = logging.getLogger('django.db.backends')
+        saved = (root.handlers[:], root.level, db_logger.level)
+        root.handlers = [handler]
+        root.setLevel(logging.DEBUG)
+        # Log every SQL query, as DEBUG = True does.
+        db_logger.setLevel(logging.DEBUG)
+        connection.force_debug_cursor = True
+        client = Client(HTTP_HOST=host)
+        timings = []
+        try:
+            client.get(url)
+            for _ in range(repeat):
+                start = time.perf_counter()
+                client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            connection.force_debug_cursor = False
+            root.handlers, level, db_level = saved
+            root.setLevel(level)
+            db_logger.setLevel(db_level)
+            handler.close()
+        timings.sort()
+        return timings
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            for name, factory in HANDLERS:
+                path = os.path.join(directory, name + '.log')
+                timings = self.measure(
+                    factory(path), options['url'], options['repeat'],
+                    options['host'],
+                )
+                self.stdout.write(
+                    '{name:25} p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  '
+                    'p99 {p99:7.2f} ms'.format(
+                        name=name, p50=percentile(timings, 50),
+                        p95=percentile(timings, 95),
+                        p99=percentile(timings, 99),
+                    )
+                )
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,125 @@
+import datetime
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from events.counters import repair_order_counters
+from events.models import Event, Order
+from stores.counters import repair_menu_item_counts
+from stores.models import MenuItem, Store
+
+
+PASSWORD = 'benchmark'
+
+
+def get_max_pk(model):
+    return model.objects.order_by('-pk').values_list('pk', flat=True).first()
+
+
+def get_new_objects(model, max_pk):
+    queryset = model.objects.order_by('pk')
+    if max_pk is not None:
+        queryset = queryset.filter(pk__gt=max_pk)
+    return queryset
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-create synthetic users, stores, menu items, events and orders '
+        'for benchmarking. Generated users have the password "{}".'
+    ).format(PASSWORD)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--stores', type=int, default=100)
+        parser.add_argument('--items-per-store', type=int, default=20)
+        parser.add_argument('--events', type=int, default=100)
+        parser.add_argument(
+            '--orders-per-event', type=int, default=50,
+            help='Capped at the number of users.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def bulk_create(self, model, objects, batch_size):
+        """Create objects and return a queryset of the new rows.
+
+        bulk_create() does not set primary keys on every backend, so the
+        new rows are found by primary key range instead.
+        """
+        max_pk = get_max_pk(model)
+        objects = iter(objects)
+        count = 0
+        while True:
+            # Build one batch at a time to keep memory bounded.
+            batch = list(itertools.islice(objects, batch_size))
+            if not batch:
+                break
+            model.objects.bulk_create(batch)
+            count += len(batch)
+        self.stdout.write('Created {count} {name}.'.format(
+            count=count, name=model._meta.verbose_name_plural,
+        ))
+        return get_new_objects(model, max_pk)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rand = random.Random(options['seed'])
+        batch_size = options['batch_size']
+
+        start = User.objects.filter(username__startswith='bench-').count()
+        password = make_password(PASSWORD)
+        user_pks = list(self.bulk_create(User, (
+            User(username='bench-{}'.format(start + i), password=password)
+            for i in range(options['users'])
+        ), batch_size).values_list('pk', flat=True))
+
+        store_pks = list(self.bulk_create(Store, (
+            Store(
+                name='Store {}'.format(i), notes='Notes {}'.format(i),
+                owner_id=rand.choice(user_pks) if user_pks else None,
+            )
+            for i in range(options['stores'])
+        ), batch_size).values_list('pk', flat=True))
+
+        new_items = self.bulk_create(MenuItem, (
+            MenuItem(
+                store_id=store_pk, name='Item {}'.format(i),
+                price=rand.randint(10, 300),
+            )
+            for store_pk in store_pks
+            for i in range(options['items_per_store'])
+        ), batch_size)
+        items = {}
+        for pk, store_pk in new_items.values_list('pk', 'store_id'):
+            items.setdefault(store_pk, []).append(pk)
+        # bulk_create() skips the receivers that maintain the counters.
+        repair_menu_item_counts(connection)
+        stores_with_items = sorted(items)
+        if not stores_with_items:
+            return
+
+        now = timezone.now()
+        events = self.bulk_create(Event, (
+            Event(
+                store_id=rand.choice(stores_with_items),
+                created_at=now - datetime.timedelta(days=i),
+            )
+            for i in reversed(range(options['events']))
+        ), batch_size).values_list('pk', 'store_id')
+
+        per_event = min(options['orders_per_event'], len(user_pks))
+        self.bulk_create(Order, (
+            Order(
+                event_id=event_pk, user_id=user_pk,
+                item_id=rand.choice(items[store_pk]),
+            )
+            for event_pk, store_pk in events
+            for user_pk in rand.sample(user_pks, per_event)
+        ), batch_size)
+        repair_order_counters(connection)
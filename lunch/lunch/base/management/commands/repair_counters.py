@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from events.counters import repair_order_counters
+from stores.counters import repair_menu_item_counts
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the denormalized store and event counters, fixing any '
+        'that drifted (e.g. after bulk_create() or raw SQL). Writes that run '
+        'at the same time may be counted twice, so run this when the site '
+        'is quiet, or run it again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        connection = connections[using]
+        with transaction.atomic(using=using):
+            stores = repair_menu_item_counts(connection)
+            events = repair_order_counters(connection)
+        self.stdout.write(
+            'Repaired counters of {stores} stores and {events} events.'.format(
+                stores=stores, events=events,
+            )
+        )
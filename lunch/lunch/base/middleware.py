@@ -0,0 +1,169 @@
+import collections
+import functools
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+from .db.routers import pin_primary, unpin_primary
+
+
+# Set after a write so that the client's next requests read from the
+# primary; see ReadYourWritesMiddleware.
+PRIMARY_COOKIE_NAME = 'use_primary'
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+_render = threading.local()
+
+
+def get_request_stats():
+    """Aggregated metrics of this worker process, keyed by URL name."""
+    with _stats_lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
+
+
+def reset_request_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _record(name, metrics):
+    with _stats_lock:
+        stats = _stats.setdefault(name, {
+            'requests': 0, 'queries': 0, 'max_queries': 0, 'duplicates': 0,
+            'sql_time': 0.0, 'render_time': 0.0, 'total_time': 0.0,
+            'max_total_time': 0.0,
+        })
+        stats['requests'] += 1
+        stats['queries'] += metrics['queries']
+        stats['max_queries'] = max(stats['max_queries'], metrics['queries'])
+        stats['duplicates'] += metrics['duplicates']
+        stats['sql_time'] += metrics['sql_time']
+        stats['render_time'] += metrics['render_time']
+        stats['total_time'] += metrics['total_time']
+        stats['max_total_time'] = max(
+            stats['max_total_time'], metrics['total_time'],
+        )
+
+
+def _time_render(render):
+    """Wrap Template.render to add the time of outermost renders up."""
+    @functools.wraps(render)
+    def timed_render(self, context):
+        if getattr(_render, 'active', False):
+            # Included or extended templates count towards the outer one.
+            return render(self, context)
+        _render.active = True
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            _render.active = False
+            _render.time = (
+                getattr(_render, 'time', 0.0) + time.perf_counter() - start
+            )
+    timed_render.timed = True
+    return timed_render
+
+
+class InstrumentationMiddleware(object):
+    """Record query count, SQL, render and response time of each request.
+
+    Metrics of a request are set on ``request.metrics``, sent in a
+    ``Server-Timing`` header, and aggregated per URL name for the worker
+    process (see ``get_request_stats()``). Render time is the time spent in
+    Django templates, including any queries they run. Put this first in
+    MIDDLEWARE_CLASSES so that it covers the other middleware too.
+    """
+
+    def __init__(self):
+        if not getattr(Template.render, 'timed', False):
+            Template.render = _time_render(Template.render)
+
+    def process_request(self, request):
+        _render.time = 0.0
+        request._instrumentation = {
+            'start': time.perf_counter(),
+            'connections': [
+                (conn, conn.force_debug_cursor, len(conn.queries_log))
+                for conn in connections.all()
+            ],
+        }
+        # Log queries even if DEBUG is off.
+        for conn, _, _ in request._instrumentation['connections']:
+            conn.force_debug_cursor = True
+
+    def process_response(self, request, response):
+        state = getattr(request, '_instrumentation', None)
+        if state is None:
+            return response
+        total_time = (time.perf_counter() - state['start']) * 1000
+        render_time = getattr(_render, 'time', 0.0) * 1000
+        queries = []
+        for conn, force_debug_cursor, initial in state['connections']:
+            conn.force_debug_cursor = force_debug_cursor
+            queries.extend(list(conn.queries_log)[initial:])
+        del request._instrumentation
+
+        counts = collections.Counter(query['sql'] for query in queries)
+        sql_time = sum(float(query['time']) for query in queries) * 1000
+        request.metrics = metrics = {
+            'queries': len(queries),
+            'duplicates': sum(n - 1 for n in counts.values()),
+            'sql_time': sql_time,
+            'render_time': render_time,
+            'total_time': total_time,
+        }
+        match = getattr(request, 'resolver_match', None)
+        _record(match.url_name if match else None, metrics)
+
+        response['Server-Timing'] = (
+            'db;dur={sql:.1f};desc="{queries} queries", '
+            'render;dur={render:.1f}, total;dur={total:.1f}'
+        ).format(
+            sql=sql_time, queries=len(queries), render=render_time,
+            total=total_time,
+        )
+        return response
+
+
+class ReadYourWritesMiddleware(object):
+    """Read from the primary database where a replica could be stale.
+
+    Requests with unsafe methods may write, so they read from the primary
+    throughout, and set a cookie that keeps the client's requests on the
+    primary for ``DATABASE_PRIMARY_STICKY_SECONDS``. That way a redirect
+    after a write never shows the page as it was before. Put this first in
+    MIDDLEWARE_CLASSES, before the session and auth middleware read.
+    Unused if there are no ``DATABASE_REPLICAS``.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+
+    def process_request(self, request):
+        request._primary_pinned = (
+            request.method not in self.SAFE_METHODS or
+            PRIMARY_COOKIE_NAME in request.COOKIES
+        )
+        if request._primary_pinned:
+            pin_primary()
+
+    def process_response(self, request, response):
+        if getattr(request, '_primary_pinned', False):
+            unpin_primary()
+        if request.method not in self.SAFE_METHODS:
+            response.set_cookie(
+                PRIMARY_COOKIE_NAME, '1',
+                max_age=settings.DATABASE_PRIMARY_STICKY_SECONDS,
+                httponly=True,
+            )
+        return response
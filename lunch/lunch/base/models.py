@@ -1,3 +1,127 @@
-from django.db import models
+from django.contrib.auth.models import Group, Permission, User
+from django.core.signals import request_started
+from django.db import connections
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
 
-# Create your models here.
+from .backends import invalidate_permissions
+
+
+class LoadedValuesMixin:
+    """Remember field values as last loaded from or saved to the database.
+
+    ``_loaded_values`` maps attribute names to values, and is empty for an
+    unsaved instance. Signal receivers use it to tell what a save changed.
+    """
+
+    _loaded_values = {}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.set_loaded_values()
+
+    def set_loaded_values(self):
+        self._loaded_values = {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+
+class CounterFieldsMixin:
+    """Leave denormalized counters out of ordinary saves.
+
+    Counters are changed with F() expressions by signal receivers, so an
+    instance loaded earlier holds stale values; saving all its fields
+    would undo any change made since. Saves of existing rows write every
+    other field instead. List the counters in ``counter_fields``.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args and
+                kwargs.get('update_fields') is None and
+                not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and
+                field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    # Persistent connections may have been dropped by the server since the
+    # last request (e.g. on restart). Close them so they are reopened,
+    # instead of failing the request.
+    for conn in connections.all():
+        if (conn.settings_dict.get('CONN_HEALTH_CHECKS') and
+                conn.connection is not None and
+                not conn.in_atomic_block and not conn.is_usable()):
+            conn.close()
+
+
+def get_changed_pks(instance, action, reverse, pk_set, related_name):
+    """Primary keys on the forward side of an m2m_changed signal."""
+    if not reverse:
+        return [instance.pk]
+    if action == 'pre_clear':
+        return list(getattr(instance, related_name).values_list(
+            'pk', flat=True,
+        ))
+    return pk_set
+
+
+@receiver(post_save, sender=User)
+def invalidate_saved_user_permissions(sender, instance, update_fields,
+                                      **kwargs):
+    # is_superuser and is_active decide the permission set too. Logging in
+    # only updates last_login.
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    invalidate_permissions([instance.pk])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_user_permissions(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    invalidate_permissions(get_changed_pks(
+        instance, action, reverse, pk_set, 'user_set',
+    ))
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_group_permissions(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    group_pks = get_changed_pks(
+        instance, action, reverse, pk_set, 'group_set',
+    )
+    invalidate_permissions(User.objects.filter(
+        groups__in=group_pks,
+    ).values_list('pk', flat=True).distinct())
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_group_users_permissions(sender, instance, **kwargs):
+    invalidate_permissions(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Permission)
+def invalidate_permission_users_permissions(sender, instance, **kwargs):
+    invalidate_permissions(User.objects.filter(
+        Q(user_permissions=instance) | Q(groups__permissions=instance),
+    ).values_list('pk', flat=True).distinct())
@@ -0,0 +1,41 @@
+import gzip
+import os
+import shutil
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.xml', '.ico',
+    '.eot', '.ttf', '.otf',
+)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hash file names, and write a gzipped copy of each text file.
+
+    The ``.gz`` files are written next to the hashed files at collectstatic
+    time, so neither base.wsgi.StaticFiles nor nginx (``gzip_static``) has
+    to compress anything per request. A copy is only kept if it is smaller.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(
+                paths, dry_run, **options):
+            if hashed_name is not None and not isinstance(
+                    processed, Exception):
+                self.compress(hashed_name, force=processed)
+            yield name, hashed_name, processed
+
+    def compress(self, name, force=False):
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return
+        path = self.path(name)
+        compressed_path = path + '.gz'
+        if not force and os.path.exists(compressed_path):
+            return
+        with open(path, 'rb') as f:
+            with gzip.GzipFile(compressed_path, 'wb', mtime=0) as out:
+                shutil.copyfileobj(f, out)
+        if os.path.getsize(compressed_path) >= os.path.getsize(path):
+            os.remove(compressed_path)
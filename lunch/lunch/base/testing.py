@@ -0,0 +1,35 @@
+from django.test import modify_settings
+
+
+INSTRUMENTATION_MIDDLEWARE = 'base.middleware.InstrumentationMiddleware'
+
+
+class QueryBudgetMixin(object):
+    """TestCase mixin to keep views within a number of queries.
+
+    Set ``query_budgets`` to a dict mapping URL names to the most queries
+    each view may make, and call ``assertQueryBudget(response)`` on test
+    client responses. The instrumentation middleware is enabled for tests
+    using this mixin.
+    """
+    query_budgets = {}
+
+    def setUp(self):
+        super().setUp()
+        modifier = modify_settings(MIDDLEWARE_CLASSES={
+            'prepend': INSTRUMENTATION_MIDDLEWARE,
+        })
+        modifier.enable()
+        self.addCleanup(modifier.disable)
+
+    def assertQueryBudget(self, response, budget=None):
+        request = response.wsgi_request
+        name = request.resolver_match.url_name
+        if budget is None:
+            budget = self.query_budgets[name]
+        metrics = request.metrics
+        self.assertLessEqual(
+            metrics['queries'], budget,
+            '{name} made {queries} queries ({duplicates} duplicates), '
+            'budget is {budget}.'.format(name=name, budget=budget, **metrics),
+        )
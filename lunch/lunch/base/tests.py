@@ -1,3 +1,568 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.signals import request_started
+from django.core.urlresolvers import resolve
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings,
+)
+
+from events.models import Event, Order, get_current_event
+from stores.models import MenuItem, Store
+from .log import AsyncFileHandler, JSONFormatter, SamplingFilter
+from .management.commands.benchmark import percentile
+from . import paginator
+from .db.routers import use_primary
+from .middleware import (
+    PRIMARY_COOKIE_NAME, InstrumentationMiddleware, get_request_stats,
+    reset_request_stats,
+)
+from .testing import QueryBudgetMixin
+from .wsgi import IMMUTABLE_CACHE_CONTROL, StaticFiles
+
+
+class GenerateDataTests(TestCase):
+
+    def test_generate_data(self):
+        stores = Store.objects.count()
+        call_command(
+            'generate_data', users=10, stores=5, items_per_store=4, events=3,
+            orders_per_event=6, batch_size=7, stdout=io.StringIO(),
+        )
+        self.assertEqual(User.objects.filter(
+            username__startswith='bench-').count(), 10)
+        self.assertEqual(Store.objects.count(), stores + 5)
+        self.assertEqual(MenuItem.objects.filter(
+            store__name__startswith='Store ').count(), 20)
+        self.assertEqual(Event.objects.count(), 3)
+        self.assertEqual(Order.objects.count(), 18)
+        for order in Order.objects.select_related('event', 'item'):
+            self.assertEqual(order.item.store_id, order.event.store_id)
+
+
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+        call_command(
+            'generate_data', users=5, stores=3, items_per_store=2, events=2,
+            orders_per_event=5, stdout=io.StringIO(),
+        )
+        fd, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile([3], 99), 3)
+
+    def test_save_and_compare(self):
+        options = {'repeat': 2, 'warmup': 0, 'stdout': io.StringIO()}
+        call_command('benchmark', save=self.path, **options)
+        with open(self.path) as f:
+            results = json.load(f)
+        self.assertIn('event_detail', results)
+        self.assertEqual(
+            set(results['home']), {'queries', 'p50', 'p95', 'p99'},
+        )
+
+        for result in results.values():
+            result['queries'] = 0
+        with open(self.path, 'w') as f:
+            json.dump(results, f)
+        with self.assertRaises(CommandError):
+            call_command('benchmark', baseline=self.path, **options)
+
+
+class InstrumentationMiddlewareTests(QueryBudgetMixin, TestCase):
+
+    query_budgets = {
+        'home': 1,
+        'store_list': 5,
+        'store_detail': 5,
+        'event_detail': 8,
+    }
+
+    def setUp(self):
+        super().setUp()
+        reset_request_stats()
+        User.objects.create_user(username='user', password='pw')
+        self.store = Store.objects.create(name='McDonalds')
+        MenuItem.objects.create(store=self.store, name='大麥克餐', price=99)
+        self.event = Event.objects.create(store=self.store)
+
+    def test_budgets(self):
+        self.assertQueryBudget(self.client.get('/'))
+        self.client.login(username='user', password='pw')
+        self.assertQueryBudget(self.client.get('/store/'))
+        self.assertQueryBudget(self.client.get(self.store.get_absolute_url()))
+        self.assertQueryBudget(self.client.get(self.event.get_absolute_url()))
+
+    def test_over_budget(self):
+        response = self.client.get('/store/')
+        with self.assertRaises(AssertionError):
+            self.assertQueryBudget(response, budget=0)
+
+    def test_server_timing(self):
+        response = self.client.get('/store/')
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="1 queries", render;dur=[\d.]+, '
+            r'total;dur=[\d.]+$',
+        )
+
+    def test_render_time(self):
+        request = RequestFactory().get('/store/')
+        middleware = InstrumentationMiddleware()
+        middleware.process_request(request)
+        with mock.patch('time.perf_counter', side_effect=[1.0, 1.5]):
+            Template('{% include inner %}').render(Context({
+                'inner': Template('{{ name }}'), 'name': 'McDonalds',
+            }))
+        middleware.process_response(request, HttpResponse())
+        # The include is counted once, as part of the outer template.
+        self.assertAlmostEqual(request.metrics['render_time'], 500)
+
+    def test_stats(self):
+        self.client.get('/store/')
+        self.client.get('/store/')
+        stats = get_request_stats()['store_list']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['queries'], 2)
+
+    def test_duplicates(self):
+        request = RequestFactory().get('/store/')
+        request.resolver_match = resolve('/store/')
+        middleware = InstrumentationMiddleware()
+        middleware.process_request(request)
+        list(Store.objects.all())
+        list(Store.objects.all())
+        middleware.process_response(request, HttpResponse())
+        self.assertEqual(request.metrics['queries'], 2)
+        self.assertEqual(request.metrics['duplicates'], 1)
+
+    def test_stats_view(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.login(username='admin', password='pw')
+        self.client.get('/')
+        response = self.client.get('/admin/request-stats/')
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(data['home']['requests'], 1)
+
+
+class LoggingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'lunch.log')
+
+    def make_record(self, msg='hello %s', args=('world',),
+                    level=logging.INFO, exc_info=None):
+        return logging.LogRecord(
+            'stores', level, __file__, 1, msg, args, exc_info,
+        )
+
+    def read_lines(self):
+        with open(self.path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_json_formatter(self):
+        data = json.loads(JSONFormatter().format(self.make_record()))
+        self.assertEqual(data['message'], 'hello world')
+        self.assertEqual(data['logger'], 'stores')
+        self.assertEqual(data['level'], 'INFO')
+        self.assertNotIn('exception', data)
+
+    def test_sampling_filter(self):
+        sampler = SamplingFilter(every=10, level='ERROR')
+        passed = [
+            sampler.filter(self.make_record(level=logging.WARNING))
+            for _ in range(30)
+        ]
+        self.assertEqual(passed.count(True), 3)
+        self.assertTrue(sampler.filter(self.make_record(level=logging.ERROR)))
+
+    def test_async_handler(self):
+        handler = AsyncFileHandler(self.path)
+        for i in range(250):
+            handler.handle(self.make_record('店家 %d', (i,)))
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            handler.handle(self.make_record(
+                'failed', (), logging.ERROR, sys.exc_info(),
+            ))
+        handler.close()
+        lines = self.read_lines()
+        self.assertEqual(len(lines), 251)
+        self.assertEqual(lines[0]['message'], '店家 0')
+        self.assertIn('ValueError: boom', lines[-1]['exception'])
+
+    def test_async_handler_reopens_moved_file(self):
+        handler = AsyncFileHandler(self.path)
+        handler.listener.stop()
+        # Write batches here instead of on the listener thread.
+        handler.target.emit_batch([self.make_record('before', ())])
+        # As logrotate does.
+        os.rename(self.path, self.path + '.1')
+        handler.target.emit_batch([self.make_record('after', ())])
+        handler.close()
+        self.assertEqual(
+            [line['message'] for line in self.read_lines()], ['after'],
+        )
+        with open(self.path + '.1', encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+
+@unittest.skipUnless(
+    connection.vendor == 'postgresql', 'Connection pooling needs PostgreSQL.',
+)
+class ConnectionPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        from .db.pool import ConnectionPool
+        import psycopg2
+        conn_params = connection.get_connection_params()
+        self.pool = ConnectionPool(
+            lambda: psycopg2.connect(**conn_params), max_size=2, timeout=0.1,
+        )
+        self.addCleanup(self.pool.close)
+
+    def terminate(self, conn):
+        other = self.pool.connect()
+        with other.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_terminate_backend(%s)', [conn.get_backend_pid()],
+            )
+        other.close()
+
+    def test_reuse(self):
+        conn = self.pool.get()
+        self.pool.put(conn)
+        self.assertIs(self.pool.get(), conn)
+
+    def test_timeout(self):
+        from .db.pool import PoolTimeout
+        self.pool.get()
+        conn = self.pool.get()
+        with self.assertRaises(PoolTimeout):
+            self.pool.get()
+        self.pool.put(conn)
+        self.assertIs(self.pool.get(), conn)
+
+    def test_rollback_on_put(self):
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+        conn = self.pool.get()
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.pool.put(conn)
+        self.assertEqual(
+            conn.get_transaction_status(), TRANSACTION_STATUS_IDLE,
+        )
+
+    def test_broken_connection_replaced(self):
+        conn = self.pool.get()
+        self.pool.put(conn)
+        self.terminate(conn)
+        new_conn = self.pool.get()
+        self.assertIsNot(new_conn, conn)
+        self.assertEqual(self.pool.size, 1)
+
+
+@unittest.skipUnless(
+    connection.vendor == 'postgresql', 'Health checks need PostgreSQL.',
+)
+class ConnectionHealthCheckTests(TransactionTestCase):
+
+    def test_broken_connection_closed(self):
+        import psycopg2
+        connection.settings_dict['CONN_HEALTH_CHECKS'] = True
+        self.addCleanup(connection.settings_dict.pop, 'CONN_HEALTH_CHECKS')
+        connection.ensure_connection()
+        other = psycopg2.connect(**connection.get_connection_params())
+        with other.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_terminate_backend(%s)',
+                [connection.connection.get_backend_pid()],
+            )
+        other.close()
+        request_started.send(sender=self.__class__)
+        self.assertIsNone(connection.connection)
+        # The next query reconnects.
+        store = Store.objects.create(name='McDonalds')
+        self.assertTrue(Store.objects.filter(pk=store.pk).exists())
+
+
+class StaticFilesTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        with override_settings(
+                STATIC_ROOT=cls.root,
+                STATICFILES_STORAGE=(
+                    'base.storage.CompressedManifestStaticFilesStorage'
+                )):
+            call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(cls.root, 'staticfiles.json')) as f:
+            cls.hashed_name = json.load(f)['paths']['base/js/base.js']
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.root)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.application = StaticFiles(self.app, self.root, '/static/')
+
+    def app(self, environ, start_response):
+        start_response('200 OK', [])
+        return [b'app']
+
+    def get(self, path, **extra):
+        environ = RequestFactory().get(path, **extra).environ
+        environ.pop('wsgi.file_wrapper', None)
+        response = {}
+
+        def start_response(status, headers):
+            response['status'] = status
+            response['headers'] = dict(headers)
+
+        response['content'] = b''.join(self.application(
+            environ, start_response,
+        ))
+        return response
+
+    def read(self, name):
+        with open(os.path.join(self.root, name), 'rb') as f:
+            return f.read()
+
+    def test_hashed(self):
+        self.assertNotEqual(self.hashed_name, 'base/js/base.js')
+        response = self.get('/static/' + self.hashed_name)
+        self.assertEqual(response['status'], '200 OK')
+        self.assertEqual(
+            response['headers']['Cache-Control'], IMMUTABLE_CACHE_CONTROL,
+        )
+        # text/ or application/javascript, depending on the platform.
+        self.assertRegex(
+            response['headers']['Content-Type'],
+            r'/javascript; charset=utf-8$',
+        )
+        self.assertNotIn('Content-Encoding', response['headers'])
+        self.assertEqual(response['content'], self.read(self.hashed_name))
+
+    def test_gzip(self):
+        response = self.get(
+            '/static/' + self.hashed_name, HTTP_ACCEPT_ENCODING='gzip',
+        )
+        self.assertEqual(response['headers']['Content-Encoding'], 'gzip')
+        self.assertEqual(response['headers']['Vary'], 'Accept-Encoding')
+        self.assertEqual(
+            gzip.decompress(response['content']),
+            self.read(self.hashed_name),
+        )
+
+    def test_gzip_not_acceptable(self):
+        for header in ['gzip;q=0', 'deflate, gzip; q=0.0', '*;q=0', 'br']:
+            response = self.get(
+                '/static/' + self.hashed_name, HTTP_ACCEPT_ENCODING=header,
+            )
+            self.assertNotIn(
+                'Content-Encoding', response['headers'], header,
+            )
+        response = self.get(
+            '/static/' + self.hashed_name,
+            HTTP_ACCEPT_ENCODING='br;q=1.0, *;q=0.5',
+        )
+        self.assertEqual(response['headers']['Content-Encoding'], 'gzip')
+
+    def test_unhashed(self):
+        response = self.get('/static/base/js/base.js')
+        self.assertEqual(
+            response['headers']['Cache-Control'], 'public, max-age=60',
+        )
+
+    def test_not_modified(self):
+        response = self.get('/static/' + self.hashed_name)
+        response = self.get(
+            '/static/' + self.hashed_name,
+            HTTP_IF_MODIFIED_SINCE=response['headers']['Last-Modified'],
+        )
+        self.assertEqual(response['status'], '304 Not Modified')
+        self.assertEqual(response['content'], b'')
+
+    def test_fall_through(self):
+        response = self.get('/static/base/js/missing.js')
+        self.assertEqual(response['content'], b'app')
+        response = self.get('/store/')
+        self.assertEqual(response['content'], b'app')
+
+
+class PermissionCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='pw')
+        self.group = Group.objects.create(name='Editors')
+        self.permission = Permission.objects.get(
+            content_type__app_label='stores', codename='delete_store',
+        )
+
+    def has_perm(self):
+        # A fresh instance, as on the next request.
+        user = User.objects.get(pk=self.user.pk)
+        return user.has_perm('stores.delete_store')
+
+    def test_cached(self):
+        self.assertFalse(self.has_perm())
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(user.has_perm('stores.delete_store'))
+
+    def test_superuser_demoted(self):
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertIn('stores.delete_store', User.objects.get(
+            pk=self.user.pk,
+        ).get_all_permissions())
+        self.user.is_superuser = False
+        self.user.save()
+        self.assertFalse(self.has_perm())
+
+    def test_login_keeps_cache(self):
+        self.assertFalse(self.has_perm())
+        self.client.login(username='user', password='pw')
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(user.has_perm('stores.delete_store'))
+
+    def test_user_permissions(self):
+        self.assertFalse(self.has_perm())
+        self.user.user_permissions.add(self.permission)
+        self.assertTrue(self.has_perm())
+        self.permission.user_set.clear()
+        self.assertFalse(self.has_perm())
+
+    def test_groups(self):
+        self.group.permissions.add(self.permission)
+        self.assertFalse(self.has_perm())
+        self.user.groups.add(self.group)
+        self.assertTrue(self.has_perm())
+        self.group.user_set.remove(self.user)
+        self.assertFalse(self.has_perm())
+
+    def test_group_permissions(self):
+        self.user.groups.add(self.group)
+        self.assertFalse(self.has_perm())
+        self.permission.group_set.add(self.group)
+        self.assertTrue(self.has_perm())
+        self.group.permissions.clear()
+        self.assertFalse(self.has_perm())
+
+    def test_group_deleted(self):
+        self.user.groups.add(self.group)
+        self.group.permissions.add(self.permission)
+        self.assertTrue(self.has_perm())
+        self.group.delete()
+        self.assertFalse(self.has_perm())
+
+    def test_session_cached(self):
+        self.client.login(username='user', password='pw')
+        self.client.get('/')
+        # Only the user; the session comes from the cache.
+        with self.assertNumQueries(1):
+            self.client.get('/')
+
+
+class EstimatedCountPaginatorTests(TestCase):
+
+    def setUp(self):
+        Store.objects.bulk_create(
+            Store(name='Store {}'.format(i)) for i in range(30)
+        )
+        self.queryset = Store.objects.order_by('pk')
+
+    def test_exact_below_threshold(self):
+        pages = paginator.EstimatedCountPaginator(self.queryset, 10)
+        self.assertEqual(pages.count, self.queryset.count())
+
+    def test_estimate(self):
+        estimate = paginator.estimate_count(self.queryset)
+        if connection.vendor != 'postgresql':
+            self.assertIsNone(estimate)
+            return
+        self.assertGreater(estimate, 0)
+        threshold = paginator.ESTIMATE_THRESHOLD
+        paginator.ESTIMATE_THRESHOLD = 0
+        self.addCleanup(setattr, paginator, 'ESTIMATE_THRESHOLD', threshold)
+        pages = paginator.EstimatedCountPaginator(self.queryset, 10)
+        self.assertEqual(pages.count, estimate)
+
+
+@unittest.skipUnless(
+    'replica' in settings.DATABASES, 'Needs a second database as replica.',
+)
+@override_settings(DATABASE_REPLICAS=('replica',))
+class ReplicaRouterTests(TestCase):
+
+    multi_db = True
+
+    def setUp(self):
+        cache.clear()
+        # Nothing is copied to the replica, as if it lagged behind.
+        self.store = Store.objects.create(name='新店家')
+
+    def test_reads_from_replica(self):
+        self.assertFalse(Store.objects.filter(pk=self.store.pk).exists())
+        with use_primary():
+            self.assertTrue(Store.objects.filter(pk=self.store.pk).exists())
+
+    def test_read_your_writes(self):
+        response = self.client.post(
+            '/store/new/', {'name': '麥當勞'}, follow=True,
+        )
+        self.assertContains(response, '麥當勞')
+        self.assertEqual(
+            self.client.cookies[PRIMARY_COOKIE_NAME]['max-age'],
+            settings.DATABASE_PRIMARY_STICKY_SECONDS,
+        )
+        # Other clients, and this one once the cookie expires, read from
+        # the replica again.
+        url = response.redirect_chain[-1][0]
+        self.assertEqual(Client().get(url).status_code, 404)
+        del self.client.cookies[PRIMARY_COOKIE_NAME]
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_cached_reads_from_primary(self):
+        event = Event.objects.create(store=self.store)
+        self.assertEqual(get_current_event()['pk'], event.pk)
+
+    @override_settings(DATABASE_REPLICAS=())
+    def test_no_replicas(self):
+        response = self.client.post('/store/new/', {'name': '麥當勞'})
+        self.assertNotIn(PRIMARY_COOKIE_NAME, response.cookies)
+        self.assertEqual(
+            self.client.get(response['Location']).status_code, 200,
+        )
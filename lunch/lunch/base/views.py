@@ -1,3 +1,11 @@
-from django.shortcuts import render
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 
-# Create your views here.
+from .middleware import get_request_stats
+
+
+@staff_member_required
+def request_stats(request):
+    """Metrics aggregated by the instrumentation middleware in this worker."""
+    stats = get_request_stats()
+    return JsonResponse({str(name): value for name, value in stats.items()})
@@ -0,0 +1,141 @@
+import json
+import mimetypes
+import os
+
+from django.utils.http import http_date, parse_http_date_safe
+
+
+# Names with a content hash never change, so clients may keep them forever.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CACHE_CONTROL = 'public, max-age=60'
+
+TEXT_TYPES = ('application/javascript', 'application/json')
+
+
+def parse_accept_encoding(header):
+    """Return the q-value of each coding in an Accept-Encoding header."""
+    qvalues = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        qvalue = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        qvalues[coding] = qvalue
+    return qvalues
+
+
+class StaticFile(object):
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in TEXT_TYPES:
+            content_type += '; charset=utf-8'
+        self.last_modified = int(stat.st_mtime)
+        self.headers = [
+            ('Content-Type', content_type),
+            ('Cache-Control',
+             IMMUTABLE_CACHE_CONTROL if immutable else CACHE_CONTROL),
+            ('Last-Modified', http_date(self.last_modified)),
+        ]
+        self.variants = [(None, path, stat.st_size)]
+        if os.path.exists(path + '.gz'):
+            self.headers.append(('Vary', 'Accept-Encoding'))
+            self.variants.insert(
+                0, ('gzip', path + '.gz', os.path.getsize(path + '.gz')),
+            )
+
+    def get_variant(self, environ):
+        qvalues = parse_accept_encoding(
+            environ.get('HTTP_ACCEPT_ENCODING', ''),
+        )
+        for encoding, path, size in self.variants:
+            # q=0 means "not acceptable"; * covers codings not listed.
+            if encoding is None or qvalues.get(
+                    encoding, qvalues.get('*', 0)) > 0:
+                return encoding, path, size
+
+
+class StaticFiles(object):
+    """WSGI middleware that serves collected static files.
+
+    Everything in ``root`` is indexed once on startup, so serving a file
+    does not stat the filesystem, and unknown paths fall through to the
+    application without touching it. Files listed as hashed in the
+    ManifestStaticFilesStorage manifest are cached by clients for a year;
+    precompressed ``.gz`` copies are sent to clients that accept them.
+
+    Files added after startup are not served until the process restarts,
+    which is when collectstatic runs anyway.
+    """
+
+    def __init__(self, application, root, prefix,
+                 manifest_name='staticfiles.json'):
+        self.application = application
+        self.prefix = prefix
+        self.files = {}
+        if root and os.path.isdir(root):
+            self.files = self.scan(root, manifest_name)
+
+    def scan(self, root, manifest_name):
+        hashed_names = set()
+        try:
+            with open(os.path.join(root, manifest_name), 'rb') as f:
+                manifest = json.loads(f.read().decode('utf-8'))
+        except (IOError, ValueError):
+            pass
+        else:
+            hashed_names.update(manifest.get('paths', {}).values())
+        files = {}
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith('.gz') or filename == manifest_name:
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                files[self.prefix + name] = StaticFile(
+                    path, immutable=name in hashed_names,
+                )
+        return files
+
+    def __call__(self, environ, start_response):
+        static_file = self.files.get(environ.get('PATH_INFO', ''))
+        if static_file is None:
+            return self.application(environ, start_response)
+        method = environ['REQUEST_METHOD']
+        if method not in ('GET', 'HEAD'):
+            start_response('405 Method Not Allowed', [('Allow', 'GET, HEAD')])
+            return []
+        if_modified_since = parse_http_date_safe(
+            environ.get('HTTP_IF_MODIFIED_SINCE', ''),
+        )
+        if (if_modified_since is not None and
+                static_file.last_modified <= if_modified_since):
+            start_response('304 Not Modified', static_file.headers)
+            return []
+        encoding, file_path, size = static_file.get_variant(environ)
+        headers = static_file.headers + [('Content-Length', str(size))]
+        if encoding is not None:
+            headers.append(('Content-Encoding', encoding))
+        start_response('200 OK', headers)
+        if method == 'HEAD':
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            return file_wrapper(open(file_path, 'rb'))
+        return read_file(file_path)
+
+
+def read_file(path, block_size=8192):
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            yield block
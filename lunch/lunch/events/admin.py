@@ -1,18 +1,41 @@
 from django.contrib import admin
 
+from base.admin import RelatedIDListFilter
+from base.paginator import EstimatedCountPaginator
 from .models import Event, Order
 
 
 class OrderInline(admin.StackedInline):
     model = Order
     extra = 1
+    # Select boxes would list every user and menu item, once per order.
+    raw_id_fields = ('user', 'item',)
 
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
     inlines = (OrderInline,)
+    list_display = ('__str__', 'created_at', 'order_count', 'order_total',)
+    list_filter = (
+        ('created_at', admin.DateFieldListFilter),
+        ('store', RelatedIDListFilter),
+    )
+    # Event.__str__ reads the store.
+    list_select_related = ('store',)
+    raw_id_fields = ('store',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('event', 'item', 'user',)
+    # Filter on the indexed event date and store through the event join.
+    list_filter = (
+        ('event__created_at', admin.DateFieldListFilter),
+        ('event__store', RelatedIDListFilter),
+    )
+    list_select_related = ('event__store', 'item', 'user',)
+    raw_id_fields = ('event', 'user', 'item',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,45 @@
+from rest_framework import filters, pagination, serializers, viewsets
+from .models import Event
+
+
+class EventSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Event
+        fields = ('id', 'store', 'order_count', 'order_total',)
+
+
+class EventDetailSerializer(EventSerializer):
+
+    order_summary = serializers.SerializerMethodField()
+
+    class Meta(EventSerializer.Meta):
+        fields = EventSerializer.Meta.fields + ('order_summary',)
+
+    def get_order_summary(self, obj):
+        return obj.get_order_summary()
+
+
+class EventPagination(pagination.CursorPagination):
+    ordering = '-pk'
+    page_size = 50
+
+
+class EventViewSet(viewsets.ReadOnlyModelViewSet):
+    """Events.
+
+    Pass ``ordering=-order_count`` or ``ordering=-order_total`` to sort by
+    the number of orders or their total price. Only a single event includes
+    its ``order_summary``, which is aggregated per event.
+    """
+    queryset = Event.objects.all()
+    serializer_class = EventSerializer
+    pagination_class = EventPagination
+    filter_backends = (filters.OrderingFilter,)
+    ordering_fields = ('id', 'created_at', 'order_count', 'order_total',)
+    ordering = ('-pk',)
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return EventDetailSerializer
+        return super().get_serializer_class()
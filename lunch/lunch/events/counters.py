@@ -0,0 +1,31 @@
+"""Recompute ``Event.order_count`` and ``Event.order_total`` from orders.
+
+The counters are normally kept up to date by signal receivers (see
+``events.models``); this repairs them after writes that skip signals, such
+as ``bulk_create()``, ``QuerySet.update()`` or raw SQL.
+"""
+
+ORDER_COUNT_SQL = """
+    (SELECT COUNT(*) FROM events_order
+     WHERE events_order.event_id = events_event.id)
+"""
+
+ORDER_TOTAL_SQL = """
+    (SELECT COALESCE(SUM(stores_menuitem.price), 0)
+     FROM events_order
+     INNER JOIN stores_menuitem ON stores_menuitem.id = events_order.item_id
+     WHERE events_order.event_id = events_event.id)
+"""
+
+REPAIR_ORDER_COUNTERS_SQL = """
+    UPDATE events_event
+    SET order_count = {count}, order_total = {total}
+    WHERE order_count <> {count} OR order_total <> {total}
+""".format(count=ORDER_COUNT_SQL, total=ORDER_TOTAL_SQL)
+
+
+def repair_order_counters(connection):
+    """Fix events whose counters are wrong; return how many were fixed."""
+    with connection.cursor() as cursor:
+        cursor.execute(REPAIR_ORDER_COUNTERS_SQL)
+        return cursor.rowcount
@@ -0,0 +1,136 @@
+import csv
+import datetime
+import json
+import uuid
+
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Order
+
+
+EXPORT_COLUMNS = (
+    ('order', 'pk'),
+    ('event', 'event_id'),
+    ('event_created_at', 'event__created_at'),
+    ('store', 'event__store__name'),
+    ('user', 'user__username'),
+    ('item', 'item__name'),
+    ('price', 'item__price'),
+    ('notes', 'notes'),
+)
+
+EXPORT_HEADERS = tuple(header for header, _ in EXPORT_COLUMNS)
+
+EXPORT_FORMATS = ('csv', 'jsonl',)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+CHUNK_SIZE = 2000
+
+
+def parse_day(value, end=False):
+    """Parse an ISO date into an aware datetime at the start of the day.
+
+    With ``end=True``, return the start of the next day instead, so the
+    date can be used as an inclusive upper bound.
+    """
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(value)
+    if end:
+        day += datetime.timedelta(days=1)
+    return timezone.make_aware(
+        datetime.datetime.combine(day, datetime.time.min),
+    )
+
+
+def get_export_queryset(event=None, since=None, until=None):
+    """Orders of an event, or of events created in ``[since, until)``."""
+    queryset = Order.objects.all()
+    if event is not None:
+        queryset = queryset.filter(event=event)
+    if since is not None:
+        queryset = queryset.filter(event__created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(event__created_at__lt=until)
+    return queryset
+
+
+def iter_rows(queryset, chunk_size=CHUNK_SIZE):
+    """Yield a tuple of ``EXPORT_COLUMNS`` values for each order.
+
+    Rows are read through a server-side cursor on PostgreSQL, and in
+    primary-key ordered chunks elsewhere, so memory stays flat.
+    """
+    queryset = queryset.order_by('pk').values_list(
+        *(lookup for _, lookup in EXPORT_COLUMNS)
+    )
+    if connections[queryset.db].vendor == 'postgresql':
+        return _iter_server_side(queryset, chunk_size)
+    return _iter_chunked(queryset, chunk_size)
+
+
+def _iter_server_side(queryset, chunk_size):
+    connection = connections[queryset.db]
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    # Named (server-side) cursors only live inside a transaction.
+    with transaction.atomic(using=queryset.db):
+        connection.ensure_connection()
+        name = 'export_{}'.format(uuid.uuid4().hex)
+        with connection.connection.cursor(name=name) as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute(sql, params)
+            yield from cursor
+
+
+def _iter_chunked(queryset, chunk_size):
+    last_pk = None
+    while True:
+        chunk = queryset
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        rows = list(chunk[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            break
+        last_pk = rows[-1][0]
+
+
+def _format_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """File-like object that returns what is written to it."""
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_HEADERS)
+    for row in rows:
+        yield writer.writerow([_format_value(value) for value in row])
+
+
+def iter_jsonl(rows):
+    for row in rows:
+        yield json.dumps(
+            dict(zip(EXPORT_HEADERS, (_format_value(v) for v in row))),
+            ensure_ascii=False,
+        ) + '\n'
+
+
+def iter_export(queryset, format='csv'):
+    """Yield the exported orders as lines of text in the given format."""
+    rows = iter_rows(queryset)
+    if format == 'jsonl':
+        return iter_jsonl(rows)
+    return iter_csv(rows)
@@ -3,6 +3,7 @@ from django import forms
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Submit
 
+from stores.forms import MenuItemChoiceField
 from .models import Event, Order
 
 
@@ -20,13 +21,31 @@ class EventForm(forms.ModelForm):
 
 
 class OrderForm(forms.ModelForm):
+    """Place an order from the menu of ``store``.
+
+    The choices come from Store.get_menu_items(), so neither rendering nor
+    validation queries the menu items.
+    """
+
+    item = MenuItemChoiceField(label='Item')
 
     class Meta:
         model = Order
-        fields = ('item', 'notes',)
+        # item is not a model form field, so that validating the instance
+        # does not check that the item exists again.
+        fields = ('notes',)
 
-    def __init__(self, *args, submit_title='Submit', **kwargs):
+    def __init__(self, *args, store=None, submit_title='Submit', **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['item'].empty_label = None
+        if store is not None:
+            self.fields['item'].items = store.get_menu_items()
+        if self.instance.item_id is not None:
+            self.initial.setdefault('item', self.instance.item_id)
         self.helper = FormHelper()
         self.helper.add_input(Submit('submit', submit_title))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('item') is not None:
+            self.instance.item = cleaned_data['item']
+        return cleaned_data
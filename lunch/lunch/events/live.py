@@ -0,0 +1,148 @@
+"""Per-event log of order changes, kept in the cache.
+
+Every change to an order takes the next sequence number of its event from
+the database (Event.order_seq, see events.models.take_order_seq), which is
+incremented in one UPDATE, so concurrent changes always get distinct
+numbers. Each change is stored under its own key, so concurrent writers
+never overwrite each other. Watchers remember the last sequence number they
+saw and ask for anything newer; if some of it has already expired they must
+reload the whole board.
+
+The latest number is also cached, as a hint. Concurrent writers may leave
+it a little behind, so watchers look up to LOOKAHEAD changes past it.
+
+A change published in a transaction that is rolled back still leaves its
+delta, and the next change takes the same number again, overwriting the
+delta. Order changes are published after the order is written, so this only
+happens if a later statement in the same transaction fails.
+"""
+import json
+import time
+
+from django.core.cache import cache
+from django.db import connections
+
+
+DELTA_TIMEOUT = 60 * 60
+
+MAX_DELTAS = 200
+
+LOOKAHEAD = 10
+
+STREAM_TIMEOUT = 55
+
+LONG_POLL_TIMEOUT = 25
+
+POLL_INTERVAL = 1
+
+KEEP_ALIVE_INTERVAL = 15
+
+
+def _seq_key(event_pk):
+    return 'events:event:{pk}:order_seq'.format(pk=event_pk)
+
+
+def _delta_key(event_pk, seq):
+    return 'events:event:{pk}:order_delta:{seq}'.format(pk=event_pk, seq=seq)
+
+
+def get_last_seq(event_pk):
+    """Return the cached hint of the latest sequence number of an event."""
+    return cache.get(_seq_key(event_pk)) or 0
+
+
+def publish_order_change(order, seq, deleted=False):
+    """Store the change of an order as number ``seq`` of its event."""
+    delta = {'seq': seq, 'order': order.pk}
+    if deleted:
+        delta['action'] = 'delete'
+    else:
+        delta.update({
+            'action': 'save',
+            'user': str(order.user),
+            'item': str(order.item),
+        })
+    cache.set(_delta_key(order.event_id, seq), delta, DELTA_TIMEOUT)
+    cache.set(_seq_key(order.event_id), seq, DELTA_TIMEOUT)
+
+
+def publish_order_deletes(event_pk, order_pks, last_seq):
+    """Store the deletion of orders as the changes up to ``last_seq``."""
+    first_seq = last_seq - len(order_pks) + 1
+    changes = {
+        _delta_key(event_pk, seq): {
+            'seq': seq, 'order': order_pk, 'action': 'delete',
+        }
+        for seq, order_pk in enumerate(order_pks, first_seq)
+    }
+    changes[_seq_key(event_pk)] = last_seq
+    cache.set_many(changes, DELTA_TIMEOUT)
+
+
+def release_connections():
+    # Watchers only read the cache while they wait, so give the database
+    # connections back (or to the pool) instead of holding them.
+    for connection in connections.all():
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def get_deltas(event_pk, since):
+    """Return ``(deltas, last_seq)`` for changes after ``since``.
+
+    ``last_seq`` is the number of the last change returned, or ``since``.
+    ``deltas`` is ``None`` if the changes are no longer all available, and
+    the watcher has to start over from a full page.
+    """
+    last_seq = max(get_last_seq(event_pk), since)
+    if last_seq - since > MAX_DELTAS:
+        return None, last_seq
+    keys = [
+        _delta_key(event_pk, seq)
+        for seq in range(since + 1, last_seq + LOOKAHEAD + 1)
+    ]
+    found = cache.get_many(keys)
+    deltas = []
+    for key in keys:
+        if key not in found:
+            break
+        deltas.append(found[key])
+    if since + len(deltas) < last_seq:
+        # A change up to the hint is missing, so it has expired.
+        return None, last_seq
+    return deltas, since + len(deltas)
+
+
+def wait_for_deltas(event_pk, since, timeout=LONG_POLL_TIMEOUT):
+    release_connections()
+    deadline = time.monotonic() + timeout
+    while True:
+        deltas, last_seq = get_deltas(event_pk, since)
+        if deltas != [] or time.monotonic() >= deadline:
+            return deltas, last_seq
+        time.sleep(POLL_INTERVAL)
+
+
+def iter_event_stream(event_pk, since, timeout=STREAM_TIMEOUT):
+    """Yield server-sent events for order changes after ``since``.
+
+    The stream ends after ``timeout`` seconds; EventSource reconnects with
+    the ``Last-Event-ID`` header set to the last sequence number it got.
+    """
+    release_connections()
+    yield 'retry: 1000\n\n'
+    deadline = time.monotonic() + timeout
+    last_write = time.monotonic()
+    while time.monotonic() < deadline:
+        deltas, last_seq = get_deltas(event_pk, since)
+        if deltas is None:
+            yield 'event: reset\ndata: {}\n\n'.format(last_seq)
+            return
+        for delta in deltas:
+            since = delta['seq']
+            yield 'id: {}\ndata: {}\n\n'.format(since, json.dumps(delta))
+            last_write = time.monotonic()
+        if time.monotonic() - last_write >= KEEP_ALIVE_INTERVAL:
+            yield ': keep-alive\n\n'
+            last_write = time.monotonic()
+        time.sleep(POLL_INTERVAL)
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from events.export import (
+    EXPORT_FORMATS, get_export_queryset, iter_export, parse_day,
+)
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Stream orders of an event, or of a date range of events.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', type=int, help='Event ID.')
+        parser.add_argument(
+            '--since', help='First event date (YYYY-MM-DD), inclusive.',
+        )
+        parser.add_argument(
+            '--until', help='Last event date (YYYY-MM-DD), inclusive.',
+        )
+        parser.add_argument(
+            '--format', choices=EXPORT_FORMATS, default='csv',
+        )
+        parser.add_argument(
+            '--output', help='File to write to (default standard output).',
+        )
+
+    def handle(self, *args, **options):
+        event = None
+        if options['event'] is not None:
+            try:
+                event = Event.objects.get(pk=options['event'])
+            except Event.DoesNotExist:
+                raise CommandError(
+                    'Event {} does not exist.'.format(options['event'])
+                )
+        try:
+            since = until = None
+            if options['since']:
+                since = parse_day(options['since'])
+            if options['until']:
+                until = parse_day(options['until'], end=True)
+        except ValueError as e:
+            raise CommandError('Invalid date {}.'.format(e))
+
+        queryset = get_export_queryset(event=event, since=since, until=until)
+        if options['output']:
+            output = open(options['output'], 'w', encoding='utf-8', newline='')
+        else:
+            output = self.stdout
+        try:
+            for line in iter_export(queryset, format=options['format']):
+                output.write(line)
+        finally:
+            if output is not self.stdout:
+                output.close()
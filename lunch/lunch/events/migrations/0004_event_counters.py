@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_order_counters(apps, schema_editor):
+    from events.counters import repair_order_counters
+    repair_order_counters(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0007_store_menu_item_count'),
+        ('events', '0003_event_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='order_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='order_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_order_counters, migrations.RunPython.noop),
+    ]
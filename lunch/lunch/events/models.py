@@ -1,13 +1,65 @@
+import collections
+
 from django.conf import settings
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from base.db.features import can_return_rows
+from base.db.routers import use_primary
+from base.models import CounterFieldsMixin, LoadedValuesMixin
+from stores.models import (
+    MenuItem, Store, menu_items_bulk_deleting, menu_items_bulk_saved,
+)
+from .live import publish_order_change, publish_order_deletes
+
+
+CURRENT_EVENT_CACHE_KEY = 'events:current_event'
+
 
-from stores.models import MenuItem
+def get_current_event():
+    """Return the latest event as a dict with ``pk``, ``name`` and ``url``.
 
+    Returns ``None`` if there are no events. The result is cached until an
+    event or store changes.
+    """
+    current_event = cache.get(CURRENT_EVENT_CACHE_KEY)
+    if current_event is None:
+        try:
+            # Cached until the next change, so do not risk a stale replica.
+            with use_primary():
+                event = Event.objects.select_related('store').latest()
+        except Event.DoesNotExist:
+            current_event = {}
+        else:
+            current_event = {
+                'pk': event.pk,
+                'name': str(event),
+                'url': event.get_absolute_url(),
+            }
+        cache.set(CURRENT_EVENT_CACHE_KEY, current_event, None)
+    return current_event or None
 
-class Event(models.Model):
+
+class Event(CounterFieldsMixin, models.Model):
 
     store = models.ForeignKey('stores.Store', related_name='events')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by the Order and MenuItem signal receivers below; see the
+    # repair_counters command. The total uses current menu prices, like
+    # the order summary.
+    order_count = models.PositiveIntegerField(default=0, editable=False)
+    order_total = models.IntegerField(default=0, editable=False)
+    # Number of the latest order change; see events.live.
+    order_seq = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('order_count', 'order_total', 'order_seq',)
 
     class Meta:
         get_latest_by = 'pk'
@@ -18,18 +70,398 @@ class Event(models.Model):
     def get_absolute_url(self):
         return reverse('event_detail', kwargs={'pk': self.pk})
 
+    @staticmethod
+    def get_order_summary_cache_key(pk):
+        return 'events:event:{pk}:order_summary'.format(pk=pk)
+
+    def get_order_summary(self):
+        key = self.get_order_summary_cache_key(self.pk)
+        summary = cache.get(key)
+        if summary is None:
+            # Cached until the next change, so do not risk a stale replica.
+            with use_primary():
+                summary = self.compute_order_summary()
+            cache.set(key, summary)
+        return summary
+
+    def compute_order_summary(self):
+        rows = (
+            self.orders.values('item', 'item__name', 'item__price')
+            .annotate(
+                count=models.Count('id'), subtotal=models.Sum('item__price'),
+            )
+            .order_by('item__name', 'item')
+        )
+        items = [{
+            'item': row['item'],
+            'name': row['item__name'],
+            'price': row['item__price'],
+            'count': row['count'],
+            'subtotal': row['subtotal'],
+        } for row in rows]
+        return {
+            'items': items,
+            'count': sum(item['count'] for item in items),
+            'total': sum(item['subtotal'] for item in items),
+        }
+
+
+class OrderManager(models.Manager):
+
+    def place(self, event, user, item, notes=''):
+        """Create or replace the user's order for an event.
+
+        On PostgreSQL this is a single ``INSERT ... ON CONFLICT DO UPDATE``;
+        on SQLite 3.35 or later, a locking UPDATE and then the upsert, in
+        one transaction. Either way concurrent submissions by the same user
+        never raise ``IntegrityError``. Elsewhere update_or_create() is
+        used, retried once if it loses a race. Returns ``(order, created)``.
+        """
+        using = router.db_for_write(self.model)
+        connection = connections[using]
+        if not can_return_rows(connection):
+            return self._update_or_create(using, event, user, item, notes)
+        if connection.vendor == 'postgresql':
+            # Retry if a concurrent insert of the same order won the race;
+            # see _upsert().
+            row = None
+            while row is None:
+                row = self._upsert(using, event, user, item, notes)
+            pk, previous_item_pk = row
+        else:
+            # SQLite cannot return the replaced item from the upsert, so
+            # read it first with a no-op UPDATE. SQLite runs in-process, so
+            # the extra statement costs no round trip, and the write lock
+            # taken by the UPDATE is held until the upsert finishes.
+            with transaction.atomic(using=using):
+                previous_item_pk = self._lock(using, event, user)
+                pk, _ = self._upsert(using, event, user, item, notes)
+        created = previous_item_pk is None
+
+        order = self.model(
+            pk=pk, event=event, user=user, item=item, notes=notes,
+        )
+        # Raw SQL skips the model signals; send post_save so receivers
+        # (e.g. the order summary cache) still see the change. The replaced
+        # item is passed as if it had been loaded, for the event total.
+        if not created:
+            order._loaded_values = {'item_id': previous_item_pk}
+        post_save.send(
+            sender=self.model, instance=order, created=created,
+            raw=False, using=using, update_fields=None,
+        )
+        order.set_loaded_values()
+        return order, created
+
+    def _get_sql_names(self, using):
+        qn = connections[using].ops.quote_name
+        opts = self.model._meta
+        return qn(opts.db_table), [
+            qn(opts.get_field(name).column)
+            for name in ('event', 'user', 'item', 'notes')
+        ]
+
+    def _lock(self, using, event, user):
+        """Lock the user's order for an event and return its item's key.
+
+        Returns ``None`` if there is no such order.
+        """
+        connection = connections[using]
+        table, (event_col, user_col, item_col, _) = (
+            self._get_sql_names(using)
+        )
+        sql = (
+            'UPDATE {table} SET {item} = {item} '
+            'WHERE {event} = %s AND {user} = %s '
+            'RETURNING {item}'
+        ).format(table=table, event=event_col, user=user_col, item=item_col)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [event.pk, user.pk])
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _upsert(self, using, event, user, item, notes):
+        """Insert or update the order, returning ``(pk, previous_item_pk)``.
+
+        ``previous_item_pk`` is ``None`` if the order was inserted. On
+        PostgreSQL it is read in the same statement; if the order was
+        inserted by a concurrent transaction after the statement started,
+        the previous item cannot be seen, so nothing is updated and
+        ``None`` is returned instead. Call again to retry.
+        """
+        connection = connections[using]
+        table, (event_col, user_col, item_col, notes_col) = (
+            self._get_sql_names(using)
+        )
+        sql = (
+            'INSERT INTO {table} ({event}, {user}, {item}, {notes}) '
+            'VALUES (%s, %s, %s, %s) '
+            'ON CONFLICT ({event}, {user}) DO UPDATE '
+            'SET {item} = EXCLUDED.{item}, {notes} = EXCLUDED.{notes} '
+        )
+        params = [event.pk, user.pk, item.pk, notes]
+        if connection.vendor == 'postgresql':
+            sql = (
+                'WITH previous AS ('
+                'SELECT {item} FROM {table} '
+                'WHERE {event} = %s AND {user} = %s FOR UPDATE) ' + sql +
+                'WHERE EXISTS (SELECT 1 FROM previous) '
+                'RETURNING {pk}, (SELECT {item} FROM previous)'
+            )
+            params = [event.pk, user.pk] + params
+        else:
+            sql += 'RETURNING {pk}, NULL'
+        sql = sql.format(
+            table=table, event=event_col, user=user_col, item=item_col,
+            notes=notes_col,
+            pk=connection.ops.quote_name(self.model._meta.pk.column),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        return tuple(row) if row else None
 
-class Order(models.Model):
+    def _update_or_create(self, using, event, user, item, notes):
+        defaults = {'item': item, 'notes': notes}
+        try:
+            with transaction.atomic(using=using):
+                return self.using(using).update_or_create(
+                    event=event, user=user, defaults=defaults,
+                )
+        except IntegrityError:
+            # Lost a race against a concurrent insert; the row exists now.
+            return self.using(using).update_or_create(
+                event=event, user=user, defaults=defaults,
+            )
+
+
+class Order(LoadedValuesMixin, models.Model):
 
     event = models.ForeignKey(Event, related_name='orders')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='orders')
     item = models.ForeignKey(MenuItem, related_name='orders')
     notes = models.TextField(blank=True, default='')
 
+    objects = OrderManager()
+
     class Meta:
         unique_together = ('event', 'user',)
+        permissions = (
+            ('export_order', 'Can export orders'),
+        )
 
     def __str__(self):
         return '{item} of {user} for {event}'.format(
-            item_name=self.item, user=self.user, event=self.event
+            item=self.item, user=self.user, event=self.event
+        )
+
+
+@receiver([post_save, post_delete], sender=Order)
+def invalidate_order_summary(sender, instance, **kwargs):
+    cache.delete(Event.get_order_summary_cache_key(instance.event_id))
+
+
+def get_item_price(item_pk):
+    # Read the price inside the counter UPDATE instead of in a query of its
+    # own.
+    opts = MenuItem._meta
+    return RawSQL('SELECT {price} FROM {table} WHERE {pk} = %s'.format(
+        price=opts.get_field('price').column, table=opts.db_table,
+        pk=opts.pk.column,
+    ), [item_pk], output_field=models.IntegerField())
+
+
+def touch_event(event_pk, **counters):
+    # An event's version covers its orders. The counters are updated in
+    # the same statement, with F() so that concurrent writers do not
+    # overwrite each other's changes.
+    Event.objects.filter(pk=event_pk).update(
+        updated_at=timezone.now(), **counters
+    )
+
+
+@receiver(post_save, sender=Order)
+def count_saved_order(sender, instance, created, **kwargs):
+    previous_item_pk = instance._loaded_values.get('item_id')
+    if created:
+        touch_event(
+            instance.event_id,
+            order_count=F('order_count') + 1,
+            order_total=(
+                F('order_total') + get_item_price(instance.item_id)
+            ),
         )
+    elif previous_item_pk not in (None, instance.item_id):
+        touch_event(
+            instance.event_id,
+            order_total=(
+                F('order_total') + get_item_price(instance.item_id) -
+                get_item_price(previous_item_pk)
+            ),
+        )
+    else:
+        touch_event(instance.event_id)
+
+
+@receiver(post_delete, sender=Order)
+def count_deleted_order(sender, instance, **kwargs):
+    # Deleting a menu item deletes its orders before the item itself, so
+    # the price can still be read here.
+    touch_event(
+        instance.event_id,
+        order_count=F('order_count') - 1,
+        order_total=F('order_total') - get_item_price(instance.item_id),
+    )
+
+
+def apply_price_changes(differences):
+    """Apply price changes, by menu item key, to event totals.
+
+    Totals use current prices, so every event with orders of a changed
+    item is updated, in one statement.
+    """
+    if not differences:
+        return
+    order_opts = Order._meta
+    params = []
+    for item_pk, difference in differences.items():
+        params.extend([item_pk, difference])
+    Event.objects.filter(orders__item__in=list(differences)).update(
+        order_total=F('order_total') + RawSQL(
+            'SELECT COALESCE(SUM(CASE {order}.{item} {cases} END), 0) '
+            'FROM {order} WHERE {order}.{event} = {event_table}.{pk}'.format(
+                order=order_opts.db_table,
+                event=order_opts.get_field('event').column,
+                item=order_opts.get_field('item').column,
+                cases=' '.join(['WHEN %s THEN %s'] * len(differences)),
+                event_table=Event._meta.db_table, pk=Event._meta.pk.column,
+            ),
+            params, output_field=models.IntegerField(),
+        ),
+    )
+
+
+@receiver(post_save, sender=MenuItem)
+def update_event_totals(sender, instance, created, **kwargs):
+    previous_price = instance._loaded_values.get('price')
+    if created or previous_price in (None, instance.price):
+        return
+    apply_price_changes({instance.pk: instance.price - previous_price})
+
+
+def take_order_seq(event_pk):
+    """Increment the event's order_seq and return it.
+
+    This is a single UPDATE (with RETURNING where the database supports
+    it, or else followed by a SELECT in the same transaction), so
+    concurrent changes get distinct numbers. Returns ``None`` if the event
+    does not exist.
+    """
+    using = router.db_for_write(Event)
+    connection = connections[using]
+    if not can_return_rows(connection):
+        with transaction.atomic(using=using):
+            events = Event.objects.using(using).filter(pk=event_pk)
+            events.update(order_seq=F('order_seq') + 1)
+            return events.values_list('order_seq', flat=True).first()
+    qn = connection.ops.quote_name
+    sql = (
+        'UPDATE {table} SET {seq} = {seq} + 1 WHERE {pk} = %s '
+        'RETURNING {seq}'
+    ).format(
+        table=qn(Event._meta.db_table),
+        seq=qn(Event._meta.get_field('order_seq').column),
+        pk=qn(Event._meta.pk.column),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [event_pk])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+@receiver(post_save, sender=Order)
+def publish_order_save(sender, instance, **kwargs):
+    seq = take_order_seq(instance.event_id)
+    if seq is not None:
+        publish_order_change(instance, seq)
+
+
+@receiver(post_delete, sender=Order)
+def publish_order_delete(sender, instance, **kwargs):
+    seq = take_order_seq(instance.event_id)
+    if seq is not None:
+        publish_order_change(instance, seq, deleted=True)
+
+
+def invalidate_store_order_summaries(store_pk):
+    # Subtotals use the current price, so every event of the store is stale.
+    pks = Event.objects.filter(store_id=store_pk).values_list('pk', flat=True)
+    cache.delete_many([Event.get_order_summary_cache_key(pk) for pk in pks])
+
+
+@receiver([post_save, post_delete], sender=MenuItem)
+def invalidate_menu_item_order_summaries(sender, instance, **kwargs):
+    invalidate_store_order_summaries(instance.store_id)
+
+
+@receiver(menu_items_bulk_saved)
+def update_bulk_saved_menu_items(sender, store, price_changes, **kwargs):
+    apply_price_changes({
+        item_pk: price - previous_price
+        for item_pk, (previous_price, price) in price_changes.items()
+    })
+    invalidate_store_order_summaries(store.pk)
+
+
+@receiver(menu_items_bulk_deleting)
+def delete_bulk_deleted_menu_item_orders(sender, store, pks, using,
+                                         **kwargs):
+    """Delete and count the orders of menu items about to be deleted.
+
+    One query reads the orders, one deletes them and one updates the
+    counters of all their events, however many there are. The events'
+    order summaries are invalidated by menu_items_bulk_saved afterwards.
+    Returns a function that publishes the deletes to live watchers, to
+    call once they are committed.
+    """
+    orders = Order.objects.using(using).filter(item__in=pks)
+    deleted = collections.defaultdict(list)
+    totals = collections.Counter()
+    for order_pk, event_pk, price in orders.order_by('pk').values_list(
+            'pk', 'event', 'item__price'):
+        deleted[event_pk].append(order_pk)
+        totals[event_pk] += price
+    if not deleted:
+        return
+    orders._raw_delete(using)
+
+    def by_event(values):
+        return Case(*[
+            When(pk=event_pk, then=Value(value))
+            for event_pk, value in values.items()
+        ], default=Value(0), output_field=models.IntegerField())
+
+    counts = {
+        event_pk: len(order_pks) for event_pk, order_pks in deleted.items()
+    }
+    events = Event.objects.using(using).filter(pk__in=list(deleted))
+    events.update(
+        updated_at=timezone.now(),
+        order_count=F('order_count') - by_event(counts),
+        order_total=F('order_total') - by_event(totals),
+        order_seq=F('order_seq') + by_event(counts),
+    )
+    # The rows stay locked until the transaction ends, so the numbers up to
+    # order_seq are the ones just taken.
+    last_seqs = list(events.values_list('pk', 'order_seq'))
+
+    def publish():
+        for event_pk, last_seq in last_seqs:
+            publish_order_deletes(event_pk, deleted[event_pk], last_seq)
+    return publish
+
+
+@receiver([post_save, post_delete], sender=Event)
+@receiver([post_save, post_delete], sender=Store)
+def invalidate_current_event(sender, **kwargs):
+    cache.delete(CURRENT_EVENT_CACHE_KEY)
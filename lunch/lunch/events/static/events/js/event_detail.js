@@ -0,0 +1,53 @@
+(function ($) {
+
+var board = $('.order-board');
+var seq = parseInt(board.data('seq'));
+
+function apply(delta) {
+  seq = delta.seq;
+  var row = board.find('tr[data-order="' + delta.order + '"]');
+  if (delta.action === 'delete') {
+    row.remove();
+    return;
+  }
+  if (!row.length) {
+    row = $('<tr><td></td><td></td></tr>').attr('data-order', delta.order);
+    board.append(row);
+  }
+  row.children('td').eq(0).text(delta.user);
+  row.children('td').eq(1).text(delta.item);
+}
+
+function stream() {
+  var source = new EventSource(board.data('stream-url') + '?since=' + seq);
+  source.onmessage = function (e) {
+    apply(JSON.parse(e.data));
+  };
+  source.addEventListener('reset', function () {
+    source.close();
+    window.location.reload();
+  });
+}
+
+function poll() {
+  $.getJSON(board.data('poll-url'), {'since': seq}).done(function (data) {
+    if (data.reset) {
+      window.location.reload();
+      return;
+    }
+    $.each(data.deltas, function (i, delta) {
+      apply(delta);
+    });
+    poll();
+  }).fail(function () {
+    setTimeout(poll, 5000);
+  });
+}
+
+if (window.EventSource) {
+  stream();
+} else {
+  poll();
+}
+
+})(jQuery);
@@ -1,3 +1,735 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import threading
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, reset_queries
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from stores.bulk import apply_operations
+from stores.menu_import import import_menu
+from stores.models import MenuItem, Store
+from .export import EXPORT_HEADERS, iter_rows
+from .live import get_deltas
+from .models import Event, Order
+
+
+class EventDetailViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='pw')
+        self.store = Store.objects.create(name='McDonalds')
+        self.items = [
+            MenuItem.objects.create(store=self.store, name='大麥克餐', price=99),
+            MenuItem.objects.create(store=self.store, name='蛋捲冰淇淋', price=15),
+        ]
+        self.event = Event.objects.create(store=self.store)
+        self.url = self.event.get_absolute_url()
+        self.client.login(username='user', password='pw')
+
+    def create_orders(self, count, start=0):
+        names = ['member{}'.format(i) for i in range(start, start + count)]
+        User.objects.bulk_create([User(username=name) for name in names])
+        Order.objects.bulk_create([
+            Order(event=self.event, user=user, item=self.items[0])
+            for user in User.objects.filter(username__in=names)
+        ])
+
+    def test_detail_view(self):
+        self.create_orders(3)
+        order = Order.objects.get(user__username='member0')
+        response = self.client.get(self.url)
+        self.assertContains(
+            response,
+            '<tr data-order="{}"><td>member0</td><td>大麥克餐</td></tr>'.format(
+                order.pk,
+            ),
+            html=True,
+        )
+
+    def test_detail_view_query_count(self):
+        # User, ETag, event with store, orders, own order, and on cache
+        # miss menu items and order summary.
+        self.create_orders(5)
+        with self.assertNumQueries(7):
+            self.client.get(self.url)
+        with self.assertNumQueries(5):
+            self.client.get(self.url)
+        self.create_orders(50, start=5)
+        cache.delete(Event.get_order_summary_cache_key(self.event.pk))
+        with self.assertNumQueries(6):
+            self.client.get(self.url)
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_modified_by_order(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.post(self.url, {'item': self.items[0].pk})
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_differs_per_user(self):
+        etag = self.client.get(self.url)['ETag']
+        User.objects.create_user(username='other', password='pw')
+        self.client.login(username='other', password='pw')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_place_order(self):
+        response = self.client.post(self.url, {'item': self.items[1].pk})
+        self.assertRedirects(response, self.url)
+        order = Order.objects.get(event=self.event, user=self.user)
+        self.assertEqual(order.item, self.items[1])
+
+    def test_replace_order(self):
+        self.client.post(self.url, {'item': self.items[0].pk})
+        self.client.post(self.url, {'item': self.items[1].pk, 'notes': '去冰'})
+        order = Order.objects.get(event=self.event, user=self.user)
+        self.assertEqual(order.item, self.items[1])
+        self.assertEqual(order.notes, '去冰')
+
+    def test_menu_choices_cached(self):
+        self.client.get(self.url)
+        # The query log is cleared when the request starts.
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'item': self.items[1].pk})
+        statements = [query['sql'] for query in queries]
+        self.assertTrue(any('events_order' in sql for sql in statements))
+        self.assertFalse(any(
+            'SELECT "stores_menuitem"."id"' in sql for sql in statements
+        ))
+        self.assertRedirects(response, self.url)
+        item = MenuItem.objects.create(store=self.store, name='薯條', price=35)
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response.context['order_form'].fields['item'].items,
+            self.items + [item],
+        )
+        self.assertEqual(
+            response.context['order_form']['item'].value(), self.items[1].pk,
+        )
+
+    def test_place_order_item_from_other_store(self):
+        other = Store.objects.create(name='肯德基')
+        item = MenuItem.objects.create(store=other, name='薄皮嫩雞', price=60)
+        response = self.client.post(self.url, {'item': item.pk})
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderSummaryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        store = Store.objects.create(name='McDonalds')
+        self.big_mac = MenuItem.objects.create(
+            store=store, name='大麥克餐', price=99,
+        )
+        self.cone = MenuItem.objects.create(
+            store=store, name='蛋捲冰淇淋', price=15,
+        )
+        self.event = Event.objects.create(store=store)
+        for i, item in enumerate([self.big_mac, self.big_mac, self.cone]):
+            user = User.objects.create_user(username='member{}'.format(i))
+            Order.objects.create(event=self.event, user=user, item=item)
+
+    def test_summary(self):
+        summary = self.event.get_order_summary()
+        self.assertEqual(summary['count'], 3)
+        self.assertEqual(summary['total'], 99 * 2 + 15)
+        self.assertEqual(summary['items'], [
+            {'item': self.big_mac.pk, 'name': '大麥克餐', 'price': 99,
+             'count': 2, 'subtotal': 198},
+            {'item': self.cone.pk, 'name': '蛋捲冰淇淋', 'price': 15,
+             'count': 1, 'subtotal': 15},
+        ])
+
+    def test_summary_cached(self):
+        self.event.get_order_summary()
+        with self.assertNumQueries(0):
+            self.event.get_order_summary()
+
+    def test_summary_updated_on_order_change(self):
+        self.event.get_order_summary()
+        order = self.event.orders.filter(item=self.cone).get()
+        order.item = self.big_mac
+        order.save()
+        self.assertEqual(self.event.get_order_summary()['total'], 99 * 3)
+        order.delete()
+        self.assertEqual(self.event.get_order_summary()['total'], 99 * 2)
+
+    def test_summary_updated_on_price_change(self):
+        self.event.get_order_summary()
+        self.cone.price = 20
+        self.cone.save()
+        self.assertEqual(self.event.get_order_summary()['total'], 99 * 2 + 20)
+
+    def test_api(self):
+        User.objects.create_user(username='user', password='pw')
+        self.client.login(username='user', password='pw')
+        response = self.client.get('/api/v1/event/{}/'.format(self.event.pk))
+        self.assertEqual(response.data['order_summary']['total'], 213)
+
+
+class PlaceOrderTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user')
+        store = Store.objects.create(name='McDonalds')
+        self.big_mac = MenuItem.objects.create(
+            store=store, name='大麥克餐', price=99,
+        )
+        self.cone = MenuItem.objects.create(
+            store=store, name='蛋捲冰淇淋', price=15,
+        )
+        self.event = Event.objects.create(store=store)
+
+    def test_create(self):
+        order, created = Order.objects.place(
+            event=self.event, user=self.user, item=self.big_mac,
+        )
+        self.assertTrue(created)
+        self.assertEqual(Order.objects.get().pk, order.pk)
+
+    def test_update(self):
+        first, _ = Order.objects.place(
+            event=self.event, user=self.user, item=self.big_mac,
+        )
+        order, created = Order.objects.place(
+            event=self.event, user=self.user, item=self.cone, notes='去冰',
+        )
+        self.assertFalse(created)
+        self.assertEqual(order.pk, first.pk)
+        self.assertEqual(Order.objects.get().item, self.cone)
+
+    def test_invalidates_summary(self):
+        Order.objects.place(event=self.event, user=self.user, item=self.cone)
+        self.assertEqual(self.event.get_order_summary()['total'], 15)
+        Order.objects.place(
+            event=self.event, user=self.user, item=self.big_mac,
+        )
+        self.assertEqual(self.event.get_order_summary()['total'], 99)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'Needs SQLite.')
+    def test_sqlite_without_returning(self):
+        # SQLite before 3.35 has no RETURNING.
+        with mock.patch.object(
+                connection.Database, 'sqlite_version_info', (3, 31, 1),
+        ), CaptureQueriesContext(connection) as queries:
+            first, created = Order.objects.place(
+                event=self.event, user=self.user, item=self.big_mac,
+            )
+            self.assertTrue(created)
+            order, created = Order.objects.place(
+                event=self.event, user=self.user, item=self.cone,
+            )
+        self.assertFalse(created)
+        self.assertEqual(order.pk, first.pk)
+        self.assertEqual(Order.objects.get().item, self.cone)
+        self.assertFalse([
+            query for query in queries if 'RETURNING' in query['sql']
+        ])
+        self.assertEqual(Event.objects.get(pk=self.event.pk).order_seq, 2)
+
+
+class EventCounterTests(TestCase):
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                username='user{}'.format(i), password='pw',
+            )
+            for i in range(2)
+        ]
+        store = Store.objects.create(name='McDonalds')
+        self.big_mac = MenuItem.objects.create(
+            store=store, name='大麥克餐', price=99,
+        )
+        self.cone = MenuItem.objects.create(
+            store=store, name='蛋捲冰淇淋', price=15,
+        )
+        self.event = Event.objects.create(store=store)
+
+    def assertCounters(self, count, total):
+        event = Event.objects.get(pk=self.event.pk)
+        self.assertEqual(
+            (event.order_count, event.order_total), (count, total),
+        )
+
+    def test_place(self):
+        Order.objects.place(
+            event=self.event, user=self.users[0], item=self.big_mac,
+        )
+        self.assertCounters(1, 99)
+        Order.objects.place(
+            event=self.event, user=self.users[1], item=self.big_mac,
+        )
+        self.assertCounters(2, 99 * 2)
+        Order.objects.place(
+            event=self.event, user=self.users[0], item=self.cone,
+        )
+        self.assertCounters(2, 99 + 15)
+
+    def test_stale_save(self):
+        event = Event.objects.get(pk=self.event.pk)
+        Order.objects.place(
+            event=self.event, user=self.users[0], item=self.big_mac,
+        )
+        event.save()
+        self.assertCounters(1, 99)
+        self.assertEqual(Event.objects.get(pk=self.event.pk).order_seq, 1)
+
+    def test_save_and_delete(self):
+        order = Order.objects.create(
+            event=self.event, user=self.users[0], item=self.big_mac,
+        )
+        self.assertCounters(1, 99)
+        order.item = self.cone
+        order.save()
+        self.assertCounters(1, 15)
+        Order.objects.get().delete()
+        self.assertCounters(0, 0)
+
+    def test_price_change(self):
+        for user in self.users:
+            Order.objects.create(event=self.event, user=user, item=self.cone)
+        cone = MenuItem.objects.get(pk=self.cone.pk)
+        cone.price = 20
+        cone.save()
+        self.assertCounters(2, 40)
+        self.assertEqual(
+            self.event.compute_order_summary()['total'], 40,
+        )
+
+    def test_bulk_price_change(self):
+        Order.objects.create(
+            event=self.event, user=self.users[0], item=self.cone,
+        )
+        Order.objects.create(
+            event=self.event, user=self.users[1], item=self.big_mac,
+        )
+        self.assertEqual(self.event.get_order_summary()['total'], 99 + 15)
+        apply_operations(self.event.store, [
+            {'action': 'update', 'id': self.cone.pk, 'price': 20},
+            {'action': 'update', 'id': self.big_mac.pk, 'price': 89},
+        ])
+        self.assertCounters(2, 89 + 20)
+        self.assertEqual(self.event.get_order_summary()['total'], 89 + 20)
+
+    def test_menu_item_deleted(self):
+        Order.objects.create(
+            event=self.event, user=self.users[0], item=self.big_mac,
+        )
+        Order.objects.create(
+            event=self.event, user=self.users[1], item=self.cone,
+        )
+        self.cone.delete()
+        self.assertCounters(1, 99)
+
+    def test_menu_items_bulk_deleted(self):
+        cache.clear()
+        other = Event.objects.create(store=self.event.store)
+        big_mac_order = Order.objects.create(
+            event=self.event, user=self.users[0], item=self.big_mac,
+        )
+        Order.objects.create(
+            event=self.event, user=self.users[1], item=self.cone,
+        )
+        other_order = Order.objects.create(
+            event=other, user=self.users[0], item=self.big_mac,
+        )
+        self.assertEqual(self.event.get_order_summary()['total'], 99 + 15)
+        _, applied = apply_operations(self.event.store, [
+            {'action': 'delete', 'id': self.big_mac.pk},
+        ])
+        self.assertTrue(applied)
+        self.assertCounters(1, 15)
+        self.assertEqual(self.event.get_order_summary()['total'], 15)
+        other = Event.objects.get(pk=other.pk)
+        self.assertEqual((other.order_count, other.order_total), (0, 0))
+        self.assertEqual(other.order_seq, 2)
+        deltas, last_seq = get_deltas(self.event.pk, 2)
+        self.assertEqual(last_seq, 3)
+        self.assertEqual(
+            deltas,
+            [{'seq': 3, 'order': big_mac_order.pk, 'action': 'delete'}],
+        )
+        self.assertEqual(get_deltas(other.pk, 1)[0], [
+            {'seq': 2, 'order': other_order.pk, 'action': 'delete'},
+        ])
+
+    def test_menu_import_dry_run(self):
+        cache.clear()
+        order = Order.objects.create(
+            event=self.event, user=self.users[0], item=self.cone,
+        )
+        rows = [['name', 'price'], ['大麥克餐', '99']]
+        report = import_menu(self.event.store, rows, dry_run=True)
+        self.assertEqual(report.deleted, 1)
+        self.assertTrue(Order.objects.filter(pk=order.pk).exists())
+        # Nothing was deleted, so watchers must not hear of it.
+        self.assertEqual(get_deltas(self.event.pk, 1), ([], 1))
+        import_menu(self.event.store, rows)
+        self.assertFalse(Order.objects.filter(pk=order.pk).exists())
+        self.assertEqual(get_deltas(self.event.pk, 1), (
+            [{'seq': 2, 'order': order.pk, 'action': 'delete'}], 2,
+        ))
+
+    def test_bulk_delete_query_count(self):
+        store = self.event.store
+
+        def count_queries(n):
+            items = [
+                MenuItem.objects.create(
+                    store=store, name='Item {}'.format(i), price=i,
+                )
+                for i in range(n)
+            ]
+            users = [
+                User.objects.create_user(username='bulk{}-{}'.format(n, i))
+                for i in range(n)
+            ]
+            for item, user in zip(items, users):
+                Order.objects.create(event=self.event, user=user, item=item)
+            with CaptureQueriesContext(connection) as queries:
+                apply_operations(store, [
+                    {'action': 'delete', 'id': item.pk} for item in items
+                ])
+            self.assertFalse(Order.objects.filter(item__in=items).exists())
+            return len(queries)
+
+        self.assertEqual(count_queries(6), count_queries(2))
+        self.assertCounters(0, 0)
+        self.assertEqual(
+            Store.objects.get(pk=store.pk).menu_item_count, 2,
+        )
+
+    def test_repair_command(self):
+        Order.objects.bulk_create([
+            Order(event=self.event, user=user, item=self.big_mac)
+            for user in self.users
+        ])
+        self.assertCounters(0, 0)
+        call_command('repair_counters', stdout=io.StringIO())
+        self.assertCounters(2, 99 * 2)
+
+    def test_api_ordering(self):
+        busy = Event.objects.create(store=self.event.store)
+        Order.objects.create(event=busy, user=self.users[0], item=self.cone)
+        self.client.login(username='user0', password='pw')
+        response = self.client.get('/api/v1/event/?ordering=-order_count')
+        self.assertEqual(
+            [(event['id'], event['order_count'])
+             for event in response.data['results']],
+            [(busy.pk, 1), (self.event.pk, 0)],
+        )
+
+    def test_api_list_query_count(self):
+        for _ in range(5):
+            Event.objects.create(store=self.event.store)
+        self.client.login(username='user0', password='pw')
+        # Session user and one page of events; no summary per event.
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/event/')
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertNotIn('order_summary', response.data['results'][0])
+
+
+class OrderAdminTests(TestCase):
+
+    def setUp(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.login(username='admin', password='pw')
+        self.store = Store.objects.create(name='McDonalds')
+        self.item = MenuItem.objects.create(
+            store=self.store, name='大麥克餐', price=99,
+        )
+        self.event = Event.objects.create(store=self.store)
+
+    def add_orders(self, count):
+        for i in range(count):
+            user = User.objects.create_user(
+                username='member{}'.format(Order.objects.count()),
+            )
+            Order.objects.create(event=self.event, user=user, item=self.item)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_query_count(self):
+        for url in ['/admin/events/order/', '/admin/events/event/',
+                    '/admin/stores/menuitem/']:
+            self.add_orders(2)
+            MenuItem.objects.create(store=self.store, name='薯條', price=35)
+            before = self.count_queries(url)
+            self.add_orders(3)
+            MenuItem.objects.create(store=self.store, name='可樂', price=25)
+            Event.objects.create(store=self.store)
+            self.assertEqual(self.count_queries(url), before, url)
+
+    def test_filters(self):
+        self.add_orders(2)
+        other = Event.objects.create(store=Store.objects.create(name='肯德基'))
+        Store.objects.create(name='Unlisted')
+        for url in ['/admin/events/order/', '/admin/events/event/',
+                    '/admin/stores/menuitem/']:
+            # Stores are picked by ID, not listed in the sidebar.
+            self.assertNotContains(self.client.get(url), 'Unlisted')
+        response = self.client.get(
+            '/admin/events/event/?store__id__exact=abc',
+        )
+        self.assertRedirects(response, '/admin/events/event/?e=1')
+        response = self.client.get(
+            '/admin/events/order/?event__store__id__exact={}'.format(
+                self.store.pk,
+            ),
+        )
+        self.assertEqual(response.context['cl'].result_count, 2)
+        response = self.client.get(
+            '/admin/events/event/?store__id__exact={}'.format(
+                other.store_id,
+            ),
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.client.get('/admin/events/order/', {
+            'event__created_at__gte': (
+                timezone.now() + datetime.timedelta(days=1)
+            ).isoformat(),
+        })
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+
+class ConcurrentOrderTests(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='user', password='pw')
+        store = Store.objects.create(name='McDonalds')
+        self.items = [
+            MenuItem.objects.create(store=store, name='大麥克餐', price=99),
+            MenuItem.objects.create(store=store, name='蛋捲冰淇淋', price=15),
+        ]
+        self.event = Event.objects.create(store=store)
+
+    def test_parallel_posts(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db(
+                connection.settings_dict['NAME']):
+            self.skipTest('In-memory SQLite cannot be shared across threads.')
+        url = self.event.get_absolute_url()
+        barrier = threading.Barrier(8)
+        responses = []
+
+        def post(item):
+            client = Client()
+            client.login(username='user', password='pw')
+            barrier.wait()
+            try:
+                responses.append(client.post(url, {'item': item.pk}))
+            finally:
+                # The test client does not close connections after a
+                # request; each thread has its own.
+                connection.close()
+
+        threads = [
+            threading.Thread(target=post, args=(self.items[i % 2],))
+            for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(
+            [response.status_code for response in responses], [302] * 8,
+        )
+        self.assertEqual(Order.objects.filter(event=self.event).count(), 1)
+        event = Event.objects.get(pk=self.event.pk)
+        self.assertEqual(event.order_count, 1)
+        self.assertEqual(event.order_total, Order.objects.get().item.price)
+        # Every change got its own number and delta.
+        self.assertEqual(event.order_seq, 8)
+        deltas, last_seq = get_deltas(self.event.pk, 0)
+        self.assertEqual([delta['seq'] for delta in deltas], list(range(1, 9)))
+
+
+class OrderExportTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username='user', password='pw')
+        user.user_permissions.add(
+            Permission.objects.get(codename='export_order'),
+        )
+        store = Store.objects.create(name='McDonalds')
+        item = MenuItem.objects.create(store=store, name='大麥克餐', price=99)
+        self.old_event = Event.objects.create(
+            store=store, created_at=datetime.datetime(
+                2015, 4, 1, 4, tzinfo=timezone.utc,
+            ),
+        )
+        self.event = Event.objects.create(
+            store=store, created_at=datetime.datetime(
+                2015, 4, 10, 4, tzinfo=timezone.utc,
+            ),
+        )
+        for i in range(5):
+            user = User.objects.create_user(username='member{}'.format(i))
+            Order.objects.create(event=self.event, user=user, item=item)
+            Order.objects.create(event=self.old_event, user=user, item=item)
+        self.client.login(username='user', password='pw')
+
+    def get_content(self, response):
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_needs_permission(self):
+        User.objects.create_user(username='member', password='pw')
+        self.client.login(username='member', password='pw')
+        event_url = '/event/{}/export/'.format(self.event.pk)
+        for url in ['/event/export/', event_url]:
+            self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.logout()
+        response = self.client.get('/event/export/')
+        self.assertEqual(response.status_code, 302)
+
+    def test_event_csv(self):
+        response = self.client.get(
+            '/event/{}/export/'.format(self.event.pk),
+        )
+        rows = list(csv.reader(io.StringIO(self.get_content(response))))
+        self.assertEqual(rows[0], list(EXPORT_HEADERS))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][3:7], ['McDonalds', 'member0', '大麥克餐', '99'])
+
+    def test_range_jsonl(self):
+        response = self.client.get(
+            '/event/export/?format=jsonl&since=2015-04-02&until=2015-04-10',
+        )
+        lines = self.get_content(response).splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(
+            {json.loads(line)['event'] for line in lines}, {self.event.pk},
+        )
+
+    def test_invalid_parameters(self):
+        response = self.client.get('/event/export/?format=xml')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/event/export/?since=yesterday')
+        self.assertEqual(response.status_code, 400)
+
+    def test_chunked_rows(self):
+        rows = list(iter_rows(Order.objects.all(), chunk_size=3))
+        self.assertEqual(
+            [row[0] for row in rows],
+            list(Order.objects.order_by('pk').values_list('pk', flat=True)),
+        )
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command(
+            'export_orders', format='jsonl', event=self.old_event.pk,
+            stdout=out,
+        )
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+
+
+class LiveOrderBoardTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='user', password='pw')
+        store = Store.objects.create(name='McDonalds')
+        self.item = MenuItem.objects.create(
+            store=store, name='大麥克餐', price=99,
+        )
+        self.event = Event.objects.create(store=store)
+        self.client.login(username='user', password='pw')
+
+    def poll(self, since=0):
+        response = self.client.get(
+            '/event/{}/orders/poll/'.format(self.event.pk),
+            {'since': since, 'timeout': 0},
+        )
+        return json.loads(response.content.decode('utf-8'))
+
+    def test_deltas(self):
+        order, _ = Order.objects.place(
+            event=self.event, user=self.user, item=self.item,
+        )
+        pk = order.pk
+        order.delete()
+        data = self.poll()
+        self.assertEqual(data['seq'], 2)
+        self.assertFalse(data['reset'])
+        self.assertEqual(data['deltas'], [
+            {'seq': 1, 'order': pk, 'action': 'save',
+             'user': 'user', 'item': '大麥克餐'},
+            {'seq': 2, 'order': pk, 'action': 'delete'},
+        ])
+        self.assertEqual(self.poll(since=1)['deltas'][0]['seq'], 2)
+        self.assertEqual(self.poll(since=2)['deltas'], [])
+
+    def test_reset_when_deltas_expired(self):
+        Order.objects.place(event=self.event, user=self.user, item=self.item)
+        cache.delete('events:event:{}:order_delta:1'.format(self.event.pk))
+        self.assertTrue(self.poll()['reset'])
+
+    def test_hint_behind(self):
+        order, _ = Order.objects.place(
+            event=self.event, user=self.user, item=self.item,
+        )
+        order.delete()
+        # A concurrent writer may leave the cached hint behind.
+        cache.set('events:event:{}:order_seq'.format(self.event.pk), 1)
+        data = self.poll(since=1)
+        self.assertEqual(data['seq'], 2)
+        self.assertEqual([delta['seq'] for delta in data['deltas']], [2])
+        cache.delete('events:event:{}:order_seq'.format(self.event.pk))
+        self.assertEqual(len(self.poll()['deltas']), 2)
+
+    def test_poll_timeout(self):
+        url = '/event/{}/orders/poll/'.format(self.event.pk)
+        for timeout in ['nan', 'inf', '-inf', 'soon']:
+            response = self.client.get(url, {'timeout': timeout})
+            self.assertEqual(response.status_code, 400)
+        with mock.patch(
+                'events.views.wait_for_deltas', return_value=([], 0),
+        ) as wait_for_deltas:
+            for timeout, expected in [('-5', 0), ('10', 10), ('600', 25)]:
+                response = self.client.get(url, {'timeout': timeout})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    wait_for_deltas.call_args[1]['timeout'], expected,
+                )
+
+    def test_page_seq(self):
+        Order.objects.place(event=self.event, user=self.user, item=self.item)
+        response = self.client.get(self.event.get_absolute_url())
+        self.assertEqual(response.context['order_seq'], 1)
+
+    def test_stream(self):
+        Order.objects.place(event=self.event, user=self.user, item=self.item)
+        response = self.client.get(
+            '/event/{}/orders/stream/'.format(self.event.pk),
+            HTTP_LAST_EVENT_ID='0',
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = iter(response.streaming_content)
+        self.assertEqual(next(content), b'retry: 1000\n\n')
+        message = next(content).decode('utf-8')
+        self.assertTrue(message.startswith('id: 1\ndata: '))
+        response.close()
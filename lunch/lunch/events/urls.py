@@ -6,4 +6,11 @@ urlpatterns = [
     url(r'^new/$', views.EventCreateView.as_view(), name='event_create'),
     url(r'^(?P<pk>\d+)/$', views.EventDetailView.as_view(),
         name='event_detail'),
+    url(r'^(?P<pk>\d+)/orders/stream/$', views.OrderStreamView.as_view(),
+        name='event_order_stream'),
+    url(r'^(?P<pk>\d+)/orders/poll/$', views.OrderPollView.as_view(),
+        name='event_order_poll'),
+    url(r'^(?P<pk>\d+)/export/$', views.OrderExportView.as_view(),
+        name='event_order_export'),
+    url(r'^export/$', views.OrderExportView.as_view(), name='order_export'),
 ]
@@ -1,10 +1,23 @@
-from django.http import HttpResponseBadRequest
-from django.shortcuts import redirect
-from django.views.generic import CreateView, DetailView
+import math
 
-from braces.views import LoginRequiredMixin
+from django.core.exceptions import PermissionDenied
+from django.db.models import Prefetch
+from django.http import (
+    HttpResponseBadRequest, JsonResponse, StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404, redirect
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.generic import CreateView, DetailView, View
 
+from braces.views import LoginRequiredMixin, PermissionRequiredMixin
+
+from base.http import get_request_etag_parts, make_etag
+from .export import (
+    CONTENT_TYPES, EXPORT_FORMATS, get_export_queryset, iter_export, parse_day,
+)
 from .forms import EventForm, OrderForm
+from .live import LONG_POLL_TIMEOUT, iter_event_stream, wait_for_deltas
 from .models import Event, Order
 
 
@@ -14,32 +27,155 @@ class EventCreateView(LoginRequiredMixin, CreateView):
     model = Event
 
 
+def event_detail_etag(request, pk):
+    versions = Event.objects.filter(pk=pk).values_list(
+        'updated_at', 'store__updated_at',
+    ).first()
+    if versions is None:
+        return None
+    event_updated_at, store_updated_at = versions
+    return make_etag(
+        'event', pk, event_updated_at, store_updated_at,
+        *get_request_etag_parts(request)
+    )
+
+
 class EventDetailView(LoginRequiredMixin, DetailView):
 
     model = Event
 
+    @method_decorator(condition(etag_func=event_detail_etag))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = Event.objects.select_related('store')
+        if self.request.method in ('GET', 'HEAD'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'orders',
+                queryset=Order.objects.select_related('user', 'item'),
+            ))
+        return queryset
+
+    def get_object(self, queryset=None):
+        # Memoize the event so it is only looked up once per request.
+        if getattr(self, 'object', None) is None:
+            self.object = super().get_object(queryset)
+        return self.object
+
     def post(self, request, *args, **kwargs):
-        order = self.get_order(user=request.user)
-        form = OrderForm(request.POST, instance=order)
+        form = self.get_order_form(data=request.POST)
         if not form.is_valid():
             return HttpResponseBadRequest()
-        order = form.save(commit=False)
-        order.user = request.user
-        order.event = self.get_object()
-        order.save()
-        return redirect(order.event.get_absolute_url())
+        event = self.get_object()
+        Order.objects.place(
+            event=event, user=request.user,
+            item=form.cleaned_data['item'], notes=form.cleaned_data['notes'],
+        )
+        return redirect(event.get_absolute_url())
 
     def get_context_data(self, **kwargs):
         data = super().get_context_data(**kwargs)
-        order = self.get_order(user=self.request.user)
-        order_form = OrderForm(instance=order)
-        order_form.fields['item'].queryset = self.object.store.menu_items.all()
-        data['order_form'] = order_form
+        data['order_form'] = self.get_order_form(
+            instance=self.get_order(user=self.request.user),
+        )
+        data['order_summary'] = self.object.get_order_summary()
+        # Read with the event, before its orders, so no change is missed;
+        # changes the page already shows are applied again harmlessly.
+        data['order_seq'] = self.object.order_seq
         return data
 
+    def get_order_form(self, data=None, instance=None):
+        return OrderForm(
+            data=data, instance=instance, store=self.get_object().store,
+        )
+
     def get_order(self, user):
         try:
             order = Order.objects.get(user=user, event=self.get_object())
         except Order.DoesNotExist:
             order = None
         return order
+
+
+class OrderExportView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """Stream orders of an event, or of a date range of events.
+
+    Query parameters: ``format`` (``csv`` or ``jsonl``), and for the range
+    export ``since`` and ``until`` as ``YYYY-MM-DD`` (both inclusive).
+    Needs the ``events.export_order`` permission.
+    """
+
+    permission_required = 'events.export_order'
+
+    def no_permissions_fail(self, request=None):
+        # Signed in, so a login redirect would not help.
+        raise PermissionDenied
+
+    def get(self, request, pk=None):
+        format = request.GET.get('format', 'csv')
+        if format not in EXPORT_FORMATS:
+            return HttpResponseBadRequest()
+        try:
+            since = until = None
+            if 'since' in request.GET:
+                since = parse_day(request.GET['since'])
+            if 'until' in request.GET:
+                until = parse_day(request.GET['until'], end=True)
+        except ValueError:
+            return HttpResponseBadRequest()
+        event = None
+        if pk is not None:
+            event = get_object_or_404(Event, pk=pk)
+        queryset = get_export_queryset(event=event, since=since, until=until)
+        response = StreamingHttpResponse(
+            iter_export(queryset, format=format),
+            content_type=CONTENT_TYPES[format],
+        )
+        filename = 'orders-{}.{}'.format(pk if pk else 'export', format)
+        response['Content-Disposition'] = (
+            'attachment; filename="{}"'.format(filename)
+        )
+        return response
+
+
+class OrderStreamView(LoginRequiredMixin, View):
+    """Server-sent events of order changes, starting after ``since``."""
+
+    def get(self, request, pk):
+        get_object_or_404(Event, pk=pk)
+        since = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get(
+            'since', 0,
+        )
+        try:
+            since = int(since)
+        except ValueError:
+            return HttpResponseBadRequest()
+        response = StreamingHttpResponse(
+            iter_event_stream(pk, since), content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class OrderPollView(LoginRequiredMixin, View):
+    """Long-poll fallback for clients without EventSource."""
+
+    def get(self, request, pk):
+        get_object_or_404(Event, pk=pk)
+        try:
+            since = int(request.GET.get('since', 0))
+            timeout = float(request.GET.get('timeout', LONG_POLL_TIMEOUT))
+        except ValueError:
+            return HttpResponseBadRequest()
+        if not math.isfinite(timeout):
+            # A NaN deadline never passes, which would hold the thread.
+            return HttpResponseBadRequest()
+        timeout = max(0, min(timeout, LONG_POLL_TIMEOUT))
+        deltas, last_seq = wait_for_deltas(pk, since, timeout=timeout)
+        return JsonResponse({
+            'seq': last_seq,
+            'reset': deltas is None,
+            'deltas': deltas or [],
+        })
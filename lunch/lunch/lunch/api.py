@@ -1,11 +1,13 @@
 from rest_framework import routers
 from tastypie.api import Api
 
+from events.api import EventViewSet
 from stores.api import StoreViewSet, MenuItemViewSet
 from stores.resources import StoreResource, MenuItemResource
 
 
 v1 = routers.DefaultRouter()
+v1.register(r'event', EventViewSet)
 v1.register(r'store', StoreViewSet)
 v1.register(r'stores/menu_item', MenuItemViewSet)
 
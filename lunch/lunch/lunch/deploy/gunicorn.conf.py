@@ -1,7 +1,16 @@
 import os
 
 bind = '127.0.0.1:8080'
-worders = (os.sysconf('SC_NPROCESSORS_ONLN') * 2) + 1
+workers = (os.sysconf('SC_NPROCESSORS_ONLN') * 2) + 1
 loglevel = 'error'
 command = '/project/venv/lunch/bin/gunicorn'
 pythonpath = '/project/lunch'
+
+# Watchers of the live order board (see events.live) keep a request open for
+# up to a minute, which would block a sync worker for all of that time.
+# Serve requests from threads instead; waiting watchers give their database
+# connection back, so each worker's threads share a small connection pool
+# (DATABASE_POOL_SIZE in the settings). Keep workers * pool size below
+# PostgreSQL's max_connections.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
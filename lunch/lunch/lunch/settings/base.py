@@ -30,6 +30,49 @@ def get_env_var(key):
         )
 
 
+def configure_connections(database, pool_size=None):
+    """Set up connection reuse for a PostgreSQL database.
+
+    Connections are kept open for DJANGO_LUNCH_DATABASE_CONN_MAX_AGE seconds
+    (60 by default) and checked before each request reuses them. With
+    threaded or gevent workers, pass ``pool_size`` or set
+    DJANGO_LUNCH_DATABASE_POOL_SIZE instead to share that many connections
+    in each worker process.
+    """
+    pool_size = os.environ.get('DJANGO_LUNCH_DATABASE_POOL_SIZE', pool_size)
+    if pool_size:
+        database['ENGINE'] = 'base.db.postgresql_pool'
+        database['CONN_MAX_AGE'] = 0
+        database.setdefault('OPTIONS', {})['pool'] = {
+            'max_size': int(pool_size),
+            'timeout': int(os.environ.get(
+                'DJANGO_LUNCH_DATABASE_POOL_TIMEOUT', 30,
+            )),
+        }
+    else:
+        database['CONN_MAX_AGE'] = int(os.environ.get(
+            'DJANGO_LUNCH_DATABASE_CONN_MAX_AGE', 60,
+        ))
+        database['CONN_HEALTH_CHECKS'] = True
+
+
+def add_replicas(databases, replicas, pool_size=None):
+    """Add read replicas as ``replica1``, ``replica2`` and so on.
+
+    Each replica is configured like the primary (see configure_connections)
+    and should be read-only. Returns the new aliases, for DATABASE_REPLICAS.
+    """
+    aliases = []
+    for i, database in enumerate(replicas, 1):
+        alias = 'replica{}'.format(i)
+        configure_connections(database, pool_size=pool_size)
+        # Tests must not create a separate database for a replica.
+        database['TEST'] = {'MIRROR': 'default'}
+        databases[alias] = database
+        aliases.append(alias)
+    return tuple(aliases)
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/1.8/howto/deployment/checklist/
 
@@ -62,6 +105,7 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'base.middleware.ReadYourWritesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -73,6 +117,13 @@ MIDDLEWARE_CLASSES = (
     'django.middleware.security.SecurityMiddleware',
 )
 
+# Opt-in per-request SQL and timing metrics (see base.middleware). It goes
+# first so that it also covers the other middleware.
+if os.environ.get('DJANGO_LUNCH_INSTRUMENTATION'):
+    MIDDLEWARE_CLASSES = (
+        ('base.middleware.InstrumentationMiddleware',) + MIDDLEWARE_CLASSES
+    )
+
 ROOT_URLCONF = 'lunch.urls'
 
 TEMPLATES = [
@@ -126,22 +177,67 @@ MEDIA_URL = '/media/'
 
 LOGIN_REDIRECT_URL = reverse_lazy('home')
 
+# Sessions are read from the cache and written through to the database, so
+# they survive cache restarts. All processes must share the cache (see the
+# production settings), or a logout in one is not seen by the others.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Reads go to DATABASE_REPLICAS if there are any, except in requests that
+# may write and for the same client DATABASE_PRIMARY_STICKY_SECONDS after
+# one, which read from the primary (see base.db.routers).
+DATABASE_ROUTERS = ('base.db.routers.ReplicaRouter',)
+DATABASE_REPLICAS = ()
+DATABASE_PRIMARY_STICKY_SECONDS = int(os.environ.get(
+    'DJANGO_LUNCH_DATABASE_PRIMARY_STICKY_SECONDS', 10,
+))
+
+# Permission sets are cached per user; see base.models for invalidation.
+AUTHENTICATION_BACKENDS = ('base.backends.CachedModelBackend',)
+
+# Records are written as JSON lines by a background thread (see base.log),
+# so request threads never wait on the disk. The file is shared by all
+# worker processes and rotated by logrotate (see lunch/deploy).
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'sample': {
+            '()': 'base.log.SamplingFilter',
+            'every': 10,
+            'level': 'ERROR',
+        },
+    },
     'handlers': {
         'file': {
             'level': 'DEBUG',
-            'class': 'logging.FileHandler',
+            'class': 'base.log.AsyncFileHandler',
             'filename': os.path.join(os.path.dirname(BASE_DIR), 'lunch.log'),
         },
     },
     'loggers': {
         '': {
             'handlers': ['file'],
-            'level': 'DEBUG',
+            'level': 'INFO',
+        },
+        'django': {
+            'level': 'INFO',
+        },
+        # One record per SQL query; raise to DEBUG when you need them.
+        'django.db.backends': {
+            'level': 'INFO',
+        },
+        # Every 404 is logged as a warning; keep a sample of them.
+        'django.request': {
+            'level': 'WARNING',
+            'filters': ['sample'],
             'propagate': True,
         },
+        'events': {
+            'level': 'DEBUG',
+        },
+        'stores': {
+            'level': 'DEBUG',
+        },
     },
 }
 
@@ -7,5 +7,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(os.path.dirname(BASE_DIR), 'db.sqlite3'),
-    }
+    },
+    # Stands in for a lagging read replica in tests (see base.tests). It is
+    # only read from if listed in DATABASE_REPLICAS.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(os.path.dirname(BASE_DIR), 'db.replica.sqlite3'),
+    },
 }
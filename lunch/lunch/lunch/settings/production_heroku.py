@@ -9,8 +9,47 @@ SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
 STATIC_ROOT = 'static'
 
+# Hashed names and gzipped copies, served by base.wsgi.StaticFiles.
+STATICFILES_STORAGE = 'base.storage.CompressedManifestStaticFilesStorage'
+
+# Parse each template once per process instead of on every render.
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
 DATABASES = {
     'default': dj_database_url.config()
 }
 
+# gunicorn serves requests from threads (see Procfile), which share this
+# many connections per worker process. Keep WEB_CONCURRENCY times this below
+# the connection limit of the database plan.
+DATABASE_POOL_SIZE = 5
+
+configure_connections(DATABASES['default'], pool_size=DATABASE_POOL_SIZE)
+
+# Follower databases, as space-separated URLs.
+DATABASE_REPLICAS = add_replicas(DATABASES, [
+    dj_database_url.parse(url) for url in os.environ.get(
+        'DJANGO_LUNCH_DATABASE_REPLICA_URLS', '',
+    ).split()
+], pool_size=DATABASE_POOL_SIZE)
+
 ALLOWED_HOSTS = ['*']
+
+# Cached data is invalidated by model signals, so every dyno must share the
+# same cache; /tmp is private to each dyno. This uses the Heroku Redis
+# add-on through the django-redis package. REDIS_URL is required: add it
+# with `heroku addons:create heroku-redis`, which sets it, before deploying.
+# Configure Redis with an allkeys-lru maxmemory policy so it evicts the
+# least recently used keys.
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': get_env_var('REDIS_URL'),
+    },
+}
@@ -15,8 +15,48 @@ DATABASES = {
     },
 }
 
+# gunicorn serves requests from threads (see deploy/gunicorn.conf.py), which
+# share this many connections per worker process.
+DATABASE_POOL_SIZE = 10
+
+configure_connections(DATABASES['default'], pool_size=DATABASE_POOL_SIZE)
+
+# Streaming replicas of the primary, as a comma-separated list of hosts.
+DATABASE_REPLICAS = add_replicas(DATABASES, [
+    dict(DATABASES['default'], HOST=host, OPTIONS={})
+    for host in os.environ.get(
+        'DJANGO_LUNCH_DATABASE_REPLICA_HOSTS', '',
+    ).split(',') if host
+], pool_size=DATABASE_POOL_SIZE)
+
 ALLOWED_HOSTS = ['*']
 
 STATIC_ROOT = os.path.join(os.path.dirname(BASE_DIR), 'static')
 
+# Hashed names and gzipped copies, served by base.wsgi.StaticFiles.
+STATICFILES_STORAGE = 'base.storage.CompressedManifestStaticFilesStorage'
+
+# Parse each template once per process instead of on every render.
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
 MEDIA_ROOT = os.path.join(os.path.dirname(BASE_DIR), 'media')
+
+# Cached data is invalidated by model signals, so every worker process must
+# share the same cache. Memcached (apt-get install memcached, and the
+# python-memcached package) evicts the least recently used keys when full,
+# instead of a random third of them like FileBasedCache, and has atomic
+# incr(). List more servers here if you run multiple hosts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.environ.get(
+            'DJANGO_LUNCH_MEMCACHED_LOCATION', '127.0.0.1:11211',
+        ).split(','),
+    },
+}
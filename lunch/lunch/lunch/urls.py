@@ -3,6 +3,7 @@ from django.conf.urls import include, url
 from django.conf.urls.static import static
 from django.contrib import admin
 
+from base.views import request_stats
 from pages.views import home
 from .api import v1, v2
 
@@ -15,6 +16,7 @@ urlpatterns = [
     url(r'^event/', include('events.urls')),
     url(r'^store/', include('stores.urls')),
 
+    url(r'^admin/request-stats/$', request_stats, name='request_stats'),
     url(r'^admin/', include(admin.site.urls)),
     url(r'^i18n/', include('django.conf.urls.i18n')),
 ]
@@ -9,10 +9,13 @@ https://docs.djangoproject.com/en/1.8/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
-from dj_static import Cling
+from base.wsgi import StaticFiles
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "lunch.settings")
 
-application = Cling(get_wsgi_application())
+application = StaticFiles(
+    get_wsgi_application(), settings.STATIC_ROOT, settings.STATIC_URL,
+)
@@ -1,8 +1,47 @@
+from django.core.cache import cache
 from django.test import TestCase
 
+from events.models import Event
+from stores.models import Store
+
 
 class HomeViewTests(TestCase):
     def test_home_view(self):
         response = self.client.get('/')
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'pages/home.html')
+
+
+class HomeViewCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.store = Store.objects.create(name='McDonalds')
+        self.event = Event.objects.create(store=self.store)
+
+    def test_current_event(self):
+        response = self.client.get('/')
+        self.assertContains(response, '今天吃：McDonalds。')
+        self.assertContains(response, self.event.get_absolute_url())
+
+    def test_no_queries_when_cached(self):
+        self.client.get('/')
+        with self.assertNumQueries(0):
+            self.client.get('/')
+
+    def test_invalidated_on_new_event(self):
+        self.client.get('/')
+        store = Store.objects.create(name='肯德基')
+        Event.objects.create(store=store)
+        self.assertContains(self.client.get('/'), '今天吃：肯德基。')
+
+    def test_invalidated_on_store_change(self):
+        self.client.get('/')
+        self.store.name = '麥當勞'
+        self.store.save()
+        self.assertContains(self.client.get('/'), '今天吃：麥當勞。')
+
+    def test_invalidated_on_event_delete(self):
+        self.client.get('/')
+        self.event.delete()
+        self.assertNotContains(self.client.get('/'), '今天吃')
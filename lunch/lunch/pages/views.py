@@ -1,11 +1,9 @@
 from django.shortcuts import render
 
-from events.models import Event
+from events.models import get_current_event
 
 
 def home(request):
-    try:
-        current_event = Event.objects.latest()
-    except Event.DoesNotExist:
-        current_event = None
-    return render(request, 'pages/home.html', {'current_event': current_event})
+    return render(request, 'pages/home.html', {
+        'current_event': get_current_event(),
+    })
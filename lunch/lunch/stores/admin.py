@@ -1,4 +1,7 @@
 from django.contrib import admin
+
+from base.admin import RelatedIDListFilter
+from base.paginator import EstimatedCountPaginator
 from .models import MenuItem, Store
 
 
@@ -9,10 +12,15 @@ class MenuItemInline(admin.TabularInline):
 
 @admin.register(MenuItem)
 class MenuItemAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price',)
+    list_display = ('name', 'price', 'store',)
+    list_filter = (('store', RelatedIDListFilter),)
+    list_select_related = ('store',)
+    raw_id_fields = ('store',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Store)
 class StoreAdmin(admin.ModelAdmin):
-    list_display = ('name', 'notes',)
+    list_display = ('name', 'notes', 'menu_item_count',)
     inlines = (MenuItemInline,)
@@ -1,5 +1,15 @@
-from rest_framework import mixins, permissions, serializers, viewsets
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework import (
+    exceptions, filters, mixins, pagination, permissions, serializers, status,
+    viewsets,
+)
+from rest_framework.decorators import detail_route
+from rest_framework.response import Response
+from .bulk import BulkError, apply_operations
+from .conditional import store_etag, store_last_modified, store_list_etag
 from .models import Store, MenuItem
+from .search import search_stores
 
 
 class MenuItemRelatedSerializer(serializers.ModelSerializer):
@@ -15,13 +25,98 @@ class MenuItemViewSet(mixins.CreateModelMixin, mixins.UpdateModelMixin,
 
 class StoreSerializer(serializers.ModelSerializer):
 
-    menu_items = MenuItemRelatedSerializer(many=True)
+    menu_items = MenuItemRelatedSerializer(many=True, read_only=True)
 
     class Meta:
         model = Store
 
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class StorePagination(pagination.CursorPagination):
+    ordering = 'pk'
+    page_size = 50
+
+
+def get_list_param(request, key):
+    value = request.query_params.get(key)
+    if value is None:
+        return None
+    return [name for name in value.split(',') if name]
+
 
 class StoreViewSet(viewsets.ModelViewSet):
+    """Stores.
+
+    Pass ``fields=name,notes`` to only include the listed fields; menu
+    items are not loaded unless ``menu_items`` is one of them.
+    Pass ``q`` to search names, notes and menu items; the best matches are
+    returned in order, on a single page. Pass ``ordering=-menu_item_count``
+    to sort by the number of menu items, and ``min_menu_items`` to skip
+    stores with fewer.
+
+    POST a list of operations to ``menu_items/`` of a store to create,
+    update and delete its menu items in one transaction (see stores.bulk).
+    """
     queryset = Store.objects.all()
     serializer_class = StoreSerializer
+    pagination_class = StorePagination
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    filter_backends = (filters.OrderingFilter,)
+    ordering_fields = ('id', 'menu_item_count',)
+    ordering = ('pk',)
+
+    @method_decorator(condition(etag_func=store_list_etag))
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get('q')
+        if query is None:
+            return super().list(request, *args, **kwargs)
+        stores = search_stores(query, queryset=self.get_queryset())
+        serializer = self.get_serializer(stores, many=True)
+        return Response({
+            'next': None, 'previous': None, 'results': serializer.data,
+        })
+
+    @method_decorator(condition(
+        etag_func=store_etag, last_modified_func=store_last_modified,
+    ))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @detail_route(methods=['post'], url_path='menu_items')
+    def bulk_menu_items(self, request, pk=None):
+        store = self.get_object()
+        try:
+            results, applied = apply_operations(store, request.data)
+        except BulkError as e:
+            raise exceptions.ParseError(str(e))
+        return Response({'results': results}, status=(
+            status.HTTP_200_OK if applied else status.HTTP_400_BAD_REQUEST
+        ))
+
+    def get_fields(self):
+        return get_list_param(self.request, 'fields')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        min_menu_items = self.request.query_params.get('min_menu_items')
+        if min_menu_items is not None:
+            try:
+                min_menu_items = int(min_menu_items)
+            except ValueError:
+                raise exceptions.ParseError(
+                    'min_menu_items must be a whole number.'
+                )
+            queryset = queryset.filter(menu_item_count__gte=min_menu_items)
+        fields = self.get_fields()
+        if fields is None or 'menu_items' in fields:
+            queryset = queryset.prefetch_related('menu_items')
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_fields())
+        return super().get_serializer(*args, **kwargs)
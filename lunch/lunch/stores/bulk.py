@@ -0,0 +1,264 @@
+"""Create, update and delete many menu items of a store at once.
+
+Operations are dicts with an ``action`` of ``create`` (with ``name`` and
+``price``), ``update`` (with ``id``, and ``name`` and/or ``price``) or
+``delete`` (with ``id``). All of them are validated first; if any is
+invalid nothing is changed. Otherwise they are applied in one transaction:
+one multi-row INSERT, one UPDATE with CASE expressions, and one DELETE.
+
+The bulk writes skip the per-item ``post_save`` and ``post_delete``
+receivers, so the store is touched once here and ``menu_items_bulk_saved``
+is sent for the rest. Deletes do not cascade either: receivers of
+``menu_items_bulk_deleting`` delete (and count) the orders of the items
+first, in a constant number of statements.
+"""
+import collections
+
+from django.db import connections, router, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from base.db.features import can_return_rows
+from .forms import MenuItemForm
+from .models import (
+    MenuItem, menu_items_bulk_deleting, menu_items_bulk_saved, touch_store,
+)
+
+
+ACTIONS = ('create', 'update', 'delete')
+
+MAX_OPERATIONS = 1000
+
+# Fields that identify an inserted item among the rows of its INSERT.
+MATCH_FIELDS = ('store', 'name', 'price',)
+
+
+class BulkError(ValueError):
+    """The request is not a list of at most MAX_OPERATIONS operations."""
+
+
+def get_form_errors(form):
+    return {name: list(errors) for name, errors in form.errors.items()}
+
+
+def clean_operations(store, operations, items):
+    """Validate operations against ``items``, the store's items by key.
+
+    Returns a list with ``(action, item, errors)`` for each operation.
+    ``item`` is an unsaved or changed MenuItem, and ``errors`` maps field
+    names to lists of messages (empty if the operation is valid).
+    """
+    cleaned = []
+    seen_pks = set()
+    for operation in operations:
+        if not isinstance(operation, dict):
+            cleaned.append((None, None, {'__all__': ['Not an object.']}))
+            continue
+        action = operation.get('action')
+        if action not in ACTIONS:
+            cleaned.append((action, None, {'action': [
+                'Must be one of: {}.'.format(', '.join(ACTIONS)),
+            ]}))
+            continue
+        if action == 'create':
+            form = MenuItemForm(data=operation)
+            form.instance.store = store
+            errors = {} if form.is_valid() else get_form_errors(form)
+            cleaned.append((action, form.instance, errors))
+            continue
+        pk = operation.get('id')
+        item = items.get(pk) if isinstance(pk, int) else None
+        if item is None:
+            cleaned.append((action, None, {'id': [
+                'No menu item {!r} in this store.'.format(pk),
+            ]}))
+            continue
+        if pk in seen_pks:
+            cleaned.append((action, item, {'id': [
+                'Menu item {} is changed more than once.'.format(pk),
+            ]}))
+            continue
+        seen_pks.add(pk)
+        errors = {}
+        if action == 'update':
+            data = {'name': item.name, 'price': item.price}
+            data.update(
+                (key, value) for key, value in operation.items()
+                if key in data
+            )
+            form = MenuItemForm(data=data, instance=item)
+            if not form.is_valid():
+                errors = get_form_errors(form)
+        cleaned.append((action, item, errors))
+    return cleaned
+
+
+def insert_items(items, using):
+    """Insert new items in one statement and set their primary keys.
+
+    Django's bulk_create() does not set primary keys; PostgreSQL and SQLite
+    3.35 or later return them with RETURNING. Elsewhere the keys are left
+    unset.
+    """
+    connection = connections[using]
+    if not can_return_rows(connection):
+        MenuItem.objects.using(using).bulk_create(items)
+        return
+    qn = connection.ops.quote_name
+    opts = MenuItem._meta
+    fields = [field for field in opts.concrete_fields if field != opts.pk]
+    key_fields = [opts.get_field(name) for name in MATCH_FIELDS]
+    batch_size = connection.ops.bulk_batch_size(fields, items) or len(items)
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        params = []
+        for item in batch:
+            params.extend(
+                field.get_db_prep_save(
+                    field.pre_save(item, add=True), connection=connection,
+                )
+                for field in fields
+            )
+        sql = (
+            'INSERT INTO {table} ({columns}) VALUES {rows} '
+            'RETURNING {pk}, {keys}'
+        )
+        sql = sql.format(
+            table=qn(opts.db_table),
+            columns=', '.join(qn(field.column) for field in fields),
+            rows=', '.join(
+                ['({})'.format(', '.join(['%s'] * len(fields)))] * len(batch)
+            ),
+            pk=qn(opts.pk.column),
+            keys=', '.join(qn(field.column) for field in key_fields),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            # Neither database promises to return the rows in the order of
+            # VALUES, so match them to the items by value. Items with equal
+            # values are interchangeable.
+            pks = collections.defaultdict(list)
+            for row in cursor.fetchall():
+                pks[tuple(row[1:])].append(row[0])
+        for item in batch:
+            item.pk = pks[tuple(
+                getattr(item, field.attname) for field in key_fields
+            )].pop()
+            item._state.adding = False
+            item._state.db = using
+
+
+def update_items(items, using):
+    """Save changed names and prices of items in one statement."""
+    now = timezone.now()
+    for item in items:
+        item.updated_at = now
+    MenuItem.objects.using(using).filter(
+        pk__in=[item.pk for item in items],
+    ).update(
+        name=Case(
+            *[When(pk=item.pk, then=Value(item.name)) for item in items],
+            default=F('name')
+        ),
+        price=Case(
+            *[When(pk=item.pk, then=Value(item.price)) for item in items],
+            default=F('price')
+        ),
+        updated_at=now,
+    )
+
+
+def delete_items(store, pks, using):
+    """Delete items of a store, and their orders, in a few statements.
+
+    Unlike QuerySet.delete(), this does not fetch the items or send signals
+    for each of them and their orders; call finish_bulk_save() afterwards.
+    Returns functions to call once the transaction is committed, e.g. to
+    tell live watchers about the deleted orders; if it is rolled back, the
+    changes they report never happened.
+    """
+    responses = menu_items_bulk_deleting.send(
+        sender=MenuItem, store=store, pks=pks, using=using,
+    )
+    MenuItem.objects.using(using).filter(
+        store=store, pk__in=pks,
+    )._raw_delete(using)
+    return [response for _, response in responses if callable(response)]
+
+
+def finish_bulk_save(store, created_count, price_changes, deleted_count=0):
+    """Do what the per-item receivers would have for bulk-changed items."""
+    touch_store(store.pk, menu_item_count=(
+        F('menu_item_count') + created_count - deleted_count
+    ))
+    menu_items_bulk_saved.send(
+        sender=MenuItem, store=store, price_changes=price_changes,
+    )
+
+
+def get_result(action, item, errors):
+    result = {'action': action}
+    if item is not None and item.pk is not None:
+        result['id'] = item.pk
+    if errors:
+        result['errors'] = errors
+    elif action != 'delete':
+        result.update({'name': item.name, 'price': item.price})
+    return result
+
+
+def apply_operations(store, operations):
+    """Validate and apply operations on the menu items of a store.
+
+    Returns ``(results, applied)``. ``results`` has a dict for each
+    operation, with ``errors`` if it is invalid. ``applied`` is False if
+    any operation was invalid, in which case nothing was changed. Raises
+    BulkError if ``operations`` is not a list, or is too long.
+    """
+    if not isinstance(operations, list):
+        raise BulkError('Expected a list of operations.')
+    if len(operations) > MAX_OPERATIONS:
+        raise BulkError('At most {} operations are allowed.'.format(
+            MAX_OPERATIONS,
+        ))
+    using = router.db_for_write(MenuItem)
+    on_commit = []
+    with transaction.atomic(using=using):
+        # Lock the items to change, so the previous prices stay accurate.
+        pks = [
+            operation.get('id') for operation in operations
+            if isinstance(operation, dict) and
+            isinstance(operation.get('id'), int)
+        ]
+        items = MenuItem.objects.using(using).select_for_update().filter(
+            store=store,
+        ).in_bulk(pks) if pks else {}
+        cleaned = clean_operations(store, operations, items)
+        applied = not any(errors for _, _, errors in cleaned)
+        if applied:
+            by_action = {action: [] for action in ACTIONS}
+            for action, item, _ in cleaned:
+                by_action[action].append(item)
+            price_changes = {
+                item.pk: (item._loaded_values['price'], item.price)
+                for item in by_action['update']
+                if item._loaded_values['price'] != item.price
+            }
+            if by_action['create']:
+                insert_items(by_action['create'], using)
+            if by_action['update']:
+                update_items(by_action['update'], using)
+                for item in by_action['update']:
+                    item.set_loaded_values()
+            if by_action['delete']:
+                on_commit = delete_items(
+                    store, [item.pk for item in by_action['delete']], using,
+                )
+            if any(by_action.values()):
+                finish_bulk_save(
+                    store, len(by_action['create']), price_changes,
+                    len(by_action['delete']),
+                )
+    for func in on_commit:
+        func()
+    return [get_result(*operation) for operation in cleaned], applied
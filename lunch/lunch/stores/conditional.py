@@ -0,0 +1,44 @@
+"""ETag and Last-Modified functions for ``condition()`` on store views.
+
+A store's ``updated_at`` is bumped whenever one of its menu items changes,
+so it versions the whole store.
+"""
+from django.db.models import Count, Max
+
+from base.http import get_request_etag_parts, make_etag
+from .models import Store
+
+
+def get_store_version(pk):
+    return Store.objects.filter(pk=pk).values_list(
+        'updated_at', flat=True,
+    ).first()
+
+
+def store_last_modified(request, pk, **kwargs):
+    return get_store_version(pk)
+
+
+def store_etag(request, pk, **kwargs):
+    version = get_store_version(pk)
+    if version is None:
+        return None
+    return make_etag('store', pk, version, request.get_full_path())
+
+
+def store_page_etag(request, pk, **kwargs):
+    version = get_store_version(pk)
+    if version is None:
+        return None
+    return make_etag('store', pk, version, *get_request_etag_parts(request))
+
+
+def store_list_etag(request, **kwargs):
+    # The count changes when a store is deleted; the latest version does not.
+    versions = Store.objects.aggregate(
+        count=Count('pk'), updated_at=Max('updated_at'),
+    )
+    return make_etag(
+        'stores', versions['count'], versions['updated_at'],
+        request.get_full_path(),
+    )
@@ -0,0 +1,23 @@
+"""Recompute ``Store.menu_item_count`` from the menu items.
+
+The counter is normally kept up to date by signal receivers (see
+``stores.models``); this repairs it after writes that skip signals, such as
+``bulk_create()`` or raw SQL.
+"""
+
+MENU_ITEM_COUNT_SQL = """
+    (SELECT COUNT(*) FROM stores_menuitem
+     WHERE stores_menuitem.store_id = stores_store.id)
+"""
+
+REPAIR_MENU_ITEM_COUNTS_SQL = """
+    UPDATE stores_store SET menu_item_count = {count}
+    WHERE menu_item_count <> {count}
+""".format(count=MENU_ITEM_COUNT_SQL)
+
+
+def repair_menu_item_counts(connection):
+    """Fix stores whose counter is wrong; return how many were fixed."""
+    with connection.cursor() as cursor:
+        cursor.execute(REPAIR_MENU_ITEM_COUNTS_SQL)
+        return cursor.rowcount
@@ -1,3 +1,5 @@
+import collections
+
 from django import forms
 from django.forms.models import inlineformset_factory
 
@@ -13,12 +15,142 @@ BaseMenuItemFormSet = inlineformset_factory(
 
 
 class MenuItemFormSet(BaseMenuItemFormSet):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    """Edits one page of a store's menu items.
+
+    Pass the page as ``queryset`` to render it. When bound, the queryset
+    defaults to the items whose IDs were posted, so only the submitted page
+    is loaded. Save with ``stores.bulk.apply_operations(store,
+    formset.get_operations())``, which writes the changed rows in bulk.
+    """
+
+    def __init__(self, data=None, *args, queryset=None, **kwargs):
+        if data is not None and queryset is None:
+            queryset = MenuItem.objects.filter(
+                pk__in=self.get_posted_pks(data, kwargs.get('prefix')),
+            )
+        super().__init__(data, *args, queryset=queryset, **kwargs)
         self.helper = FormHelper()
         self.helper.form_tag = False
         self.helper.disable_csrf = True
 
+    @classmethod
+    def get_posted_pks(cls, data, prefix=None):
+        prefix = prefix or cls.get_default_prefix()
+        try:
+            count = int(data.get('{}-INITIAL_FORMS'.format(prefix), 0))
+        except ValueError:
+            return []
+        pks = []
+        for i in range(min(count, cls.max_num)):
+            try:
+                pks.append(int(data.get('{}-{}-id'.format(prefix, i))))
+            except (TypeError, ValueError):
+                pass
+        return pks
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        if form.is_bound:
+            # The default ModelChoiceField queries each posted ID on its
+            # own; the posted page is already loaded.
+            field = form.fields[self._pk_field.name]
+            form.fields[self._pk_field.name] = MenuItemChoiceField(
+                items=self.get_queryset(), required=False,
+                widget=field.widget, initial=field.initial,
+            )
+
+    def get_operations(self):
+        """Return bulk operations for the changed forms; see stores.bulk."""
+        operations = []
+        for form in self.initial_forms:
+            if self._should_delete_form(form):
+                operations.append({'action': 'delete', 'id': form.instance.pk})
+            elif form.has_changed():
+                operations.append({
+                    'action': 'update', 'id': form.instance.pk,
+                    'name': form.cleaned_data['name'],
+                    'price': form.cleaned_data['price'],
+                })
+        for form in self.extra_forms:
+            if form.has_changed() and not self._should_delete_form(form):
+                operations.append({
+                    'action': 'create',
+                    'name': form.cleaned_data['name'],
+                    'price': form.cleaned_data['price'],
+                })
+        return operations
+
+
+class MenuItemForm(forms.ModelForm):
+    """Validates one menu item of a bulk change; see stores.bulk."""
+
+    class Meta:
+        model = MenuItem
+        fields = ('name', 'price',)
+
+
+class MenuItemChoiceField(forms.ChoiceField):
+    """Choose one of the given menu items, e.g. Store.get_menu_items().
+
+    Unlike ModelChoiceField, neither rendering nor cleaning queries the
+    database. Cleans to the chosen MenuItem.
+    """
+
+    def __init__(self, items=(), **kwargs):
+        super().__init__(**kwargs)
+        self.items = items
+
+    @property
+    def items(self):
+        return list(self._items.values())
+
+    @items.setter
+    def items(self, items):
+        self._items = collections.OrderedDict(
+            (str(item.pk), item) for item in items
+        )
+        self.choices = [(key, str(item)) for key, item in self._items.items()]
+
+    def prepare_value(self, value):
+        if isinstance(value, MenuItem):
+            return value.pk
+        return value
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self._items[str(value)]
+        except KeyError:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice',
+                params={'value': value},
+            )
+
+    def validate(self, value):
+        # Skip ChoiceField's check; to_python() only returns valid choices.
+        forms.Field.validate(self, value)
+
+    def has_changed(self, initial, data):
+        initial = '' if initial is None else self.prepare_value(initial)
+        return str(initial) != str('' if data is None else data)
+
+
+class MenuImportForm(forms.Form):
+    """Upload a menu file; see stores.menu_import."""
+
+    file = forms.FileField(
+        label='檔案', help_text='CSV 或 XLSX 檔，第一列為「品項」、「單價」。',
+    )
+    keep_missing = forms.BooleanField(
+        label='保留檔案中沒有的品項', required=False,
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.add_input(Submit('submit', '匯入'))
+
 
 class StoreForm(forms.ModelForm):
 
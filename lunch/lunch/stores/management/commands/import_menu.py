@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stores.menu_import import (
+    BATCH_SIZE, IMPORT_FORMATS, MenuImportError, get_format, import_menu,
+    iter_rows,
+)
+from stores.models import Store
+
+
+class Command(BaseCommand):
+    help = (
+        'Make the menu of a store match a CSV or XLSX file with name and '
+        'price columns. Items are matched by name.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('store', type=int, help='Store ID.')
+        parser.add_argument('path', help='File to import.')
+        parser.add_argument(
+            '--format', choices=IMPORT_FORMATS,
+            help='File format (default from the file extension).',
+        )
+        parser.add_argument(
+            '--keep-missing', action='store_true',
+            help='Keep menu items that are not in the file.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report the changes without saving them.',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            store = Store.objects.get(pk=options['store'])
+        except Store.DoesNotExist:
+            raise CommandError(
+                'Store {} does not exist.'.format(options['store'])
+            )
+        format = options['format'] or get_format(options['path'])
+        if format is None:
+            raise CommandError('Unknown file format; use --format.')
+        try:
+            with open(options['path'], 'rb') as f:
+                report = import_menu(
+                    store, iter_rows(f, format),
+                    keep_missing=options['keep_missing'],
+                    dry_run=options['dry_run'],
+                    batch_size=options['batch_size'],
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+        except MenuImportError as e:
+            raise CommandError('\n'.join(e.errors))
+        self.stdout.write(
+            '{prefix}{r.created} created, {r.updated} updated, {r.deleted} '
+            'deleted, {r.unchanged} unchanged.'.format(
+                prefix='Dry run: ' if options['dry_run'] else '', r=report,
+            )
+        )
@@ -0,0 +1,213 @@
+"""Import the menu of a store from a CSV or XLSX file.
+
+The file starts with a header row naming the ``name`` and ``price`` columns
+(or 品項 and 單價), followed by one menu item per row. Rows are matched
+with the store's menu items by name: new names are inserted, changed
+prices updated and, unless ``keep_missing`` is set, items that are not in
+the file deleted.
+
+Rows are read one at a time and changes written in batches, so memory is
+bounded by the size of the store's menu rather than of the file. All
+batches run in one transaction; if any row is invalid, the menu is left
+as it was. XLSX files are read with openpyxl in read-only mode.
+"""
+import codecs
+import collections
+import csv
+import os
+
+from django.db import router, transaction
+
+from .bulk import delete_items, finish_bulk_save, insert_items, update_items
+from .forms import MenuItemForm
+from .models import MenuItem
+
+
+IMPORT_FORMATS = ('csv', 'xlsx',)
+
+HEADERS = {
+    'name': 'name',
+    '品項': 'name',
+    'price': 'price',
+    '單價': 'price',
+}
+
+BATCH_SIZE = 500
+
+# Stop reading after this many invalid rows.
+MAX_ERRORS = 20
+
+ImportReport = collections.namedtuple(
+    'ImportReport', ('created', 'updated', 'deleted', 'unchanged'),
+)
+
+
+class MenuImportError(ValueError):
+    """The file cannot be imported; ``errors`` lists why."""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def get_format(filename):
+    """Return the import format for a file name, or ``None``."""
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    return extension if extension in IMPORT_FORMATS else None
+
+
+def iter_csv(file):
+    # Decode lazily; the BOM that spreadsheet programs write is skipped.
+    reader = csv.reader(codecs.iterdecode(file, 'utf-8-sig'))
+    try:
+        yield from reader
+    except UnicodeDecodeError:
+        raise MenuImportError([
+            'The file is not UTF-8 text; save it as CSV (UTF-8).',
+        ])
+    except csv.Error as e:
+        raise MenuImportError([
+            'Line {}: not valid CSV ({}).'.format(reader.line_num, e),
+        ])
+
+
+def iter_xlsx(file):
+    try:
+        import openpyxl
+    except ImportError:
+        raise MenuImportError(['Importing XLSX files needs openpyxl.'])
+    try:
+        workbook = openpyxl.load_workbook(
+            file, read_only=True, data_only=True,
+        )
+    except Exception:
+        raise MenuImportError(['Not a valid XLSX file.'])
+    try:
+        for row in workbook.active.iter_rows():
+            yield [cell.value for cell in row]
+    finally:
+        workbook.close()
+
+
+def iter_rows(file, format):
+    """Yield the rows of a binary file as lists of cell values."""
+    if format == 'xlsx':
+        return iter_xlsx(file)
+    return iter_csv(file)
+
+
+def get_columns(header):
+    columns = {}
+    for i, value in enumerate(header or ()):
+        key = HEADERS.get(str(value or '').strip().lower())
+        if key is not None:
+            columns.setdefault(key, i)
+    if len(columns) < 2:
+        raise MenuImportError([
+            'The first row must name the name and price columns.',
+        ])
+    return columns['name'], columns['price']
+
+
+def get_cell(row, i):
+    value = row[i] if i < len(row) else None
+    return '' if value is None else value
+
+
+def import_menu(store, rows, keep_missing=False, dry_run=False,
+                batch_size=BATCH_SIZE):
+    """Make the menu of a store match rows of cell values, header first.
+
+    Returns an ImportReport with the number of created, updated, deleted
+    and unchanged items. Raises MenuImportError if any row is invalid, and
+    then changes nothing. With ``dry_run``, the changes are rolled back.
+    """
+    rows = iter(rows)
+    name_column, price_column = get_columns(next(rows, None))
+    using = router.db_for_write(MenuItem)
+    with transaction.atomic(using=using):
+        # Lock the menu, so the previous prices stay accurate.
+        existing = {}
+        extra_pks = []
+        for pk, name, price in store.menu_items.using(using).select_for_update(
+        ).order_by('pk').values_list('pk', 'name', 'price').iterator():
+            if name in existing:
+                extra_pks.append(pk)
+            else:
+                existing[name] = (pk, price)
+
+        seen = set()
+        errors = []
+        creates, updates, price_changes = [], [], {}
+        created = updated = unchanged = 0
+        for line, row in enumerate(rows, 2):
+            row = list(row)
+            if all(value in (None, '') for value in row):
+                continue
+            form = MenuItemForm(data={
+                'name': get_cell(row, name_column),
+                'price': get_cell(row, price_column),
+            })
+            if not form.is_valid():
+                errors.append('Line {}: {}'.format(line, ' '.join(
+                    message for messages in form.errors.values()
+                    for message in messages
+                )))
+            elif form.cleaned_data['name'] in seen:
+                errors.append('Line {}: {} is listed more than once.'.format(
+                    line, form.cleaned_data['name'],
+                ))
+            if len(errors) >= MAX_ERRORS:
+                break
+            if errors:
+                # Keep reading to report more errors, but write nothing.
+                continue
+            name = form.cleaned_data['name']
+            price = form.cleaned_data['price']
+            seen.add(name)
+            if name not in existing:
+                creates.append(MenuItem(store=store, name=name, price=price))
+            elif existing[name][1] != price:
+                pk, previous_price = existing[name]
+                updates.append(MenuItem(
+                    pk=pk, store=store, name=name, price=price,
+                ))
+                price_changes[pk] = (previous_price, price)
+            else:
+                unchanged += 1
+            if len(creates) >= batch_size:
+                insert_items(creates, using)
+                created += len(creates)
+                creates = []
+            if len(updates) >= batch_size:
+                update_items(updates, using)
+                updated += len(updates)
+                updates = []
+        if errors:
+            raise MenuImportError(errors)
+        if creates:
+            insert_items(creates, using)
+            created += len(creates)
+        if updates:
+            update_items(updates, using)
+            updated += len(updates)
+
+        deleted = 0
+        on_commit = []
+        if not keep_missing:
+            missing_pks = extra_pks + [
+                pk for name, (pk, _) in existing.items() if name not in seen
+            ]
+            for start in range(0, len(missing_pks), batch_size):
+                on_commit.extend(delete_items(
+                    store, missing_pks[start:start + batch_size], using,
+                ))
+            deleted = len(missing_pks)
+        if created or updated or deleted:
+            finish_bulk_save(store, created, price_changes, deleted)
+        if dry_run:
+            transaction.set_rollback(True, using=using)
+    if not dry_run:
+        for func in on_commit:
+            func()
+    return ImportReport(created, updated, deleted, unchanged)
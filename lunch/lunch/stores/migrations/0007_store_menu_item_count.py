@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_menu_item_counts(apps, schema_editor):
+    from stores.counters import repair_menu_item_counts
+    repair_menu_item_counts(schema_editor.connection)
+
+
+def create_search_index(apps, schema_editor):
+    # SQLite rebuilds the store table to add a column, which drops the
+    # triggers that keep the search index in sync.
+    from stores.search import create_search_index
+    create_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='store',
+            name='menu_item_count',
+            field=models.PositiveIntegerField(default=0, editable=False, db_index=True, verbose_name='menu item count'),
+        ),
+        migrations.RunPython(fill_menu_item_counts, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,22 @@
 from django.conf import settings
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
+from base.db.routers import use_primary
+from base.models import CounterFieldsMixin, LoadedValuesMixin
 
-class Store(models.Model):
+
+# Old versions are never read again, so just let them expire.
+MENU_ITEMS_CACHE_TIMEOUT = 86400
+
+
+class Store(CounterFieldsMixin, models.Model):
 
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL, null=True, related_name='owned_stores',
@@ -16,6 +28,17 @@ class Store(models.Model):
     notes = models.TextField(
         blank=True, default='', verbose_name=_('notes'),
     )
+    updated_at = models.DateTimeField(
+        auto_now=True, db_index=True, verbose_name=_('updated at'),
+    )
+    # Maintained by the MenuItem signal receivers below; see the
+    # repair_counters command.
+    menu_item_count = models.PositiveIntegerField(
+        default=0, db_index=True, editable=False,
+        verbose_name=_('menu item count'),
+    )
+
+    counter_fields = ('menu_item_count',)
 
     class Meta:
         verbose_name = _('Store')
@@ -27,15 +50,40 @@ class Store(models.Model):
     def get_absolute_url(self):
         return reverse('store_detail', kwargs={'pk': self.pk})
 
+    @staticmethod
+    def get_menu_items_cache_key(pk, version):
+        return 'stores:store:{pk}:{version}:menu_items'.format(
+            pk=pk, version=version.isoformat(),
+        )
+
+    def get_menu_items(self):
+        """The store's menu items, as a list cached per store version.
+
+        The key includes updated_at, which every menu change updates (see
+        touch_store), so entries never need to be invalidated.
+        """
+        key = self.get_menu_items_cache_key(self.pk, self.updated_at)
+        items = cache.get(key)
+        if items is None:
+            # Read the menu from the primary, so it is at least as new as
+            # the version it is cached under.
+            with use_primary():
+                items = list(self.menu_items.order_by('pk'))
+            cache.set(key, items, MENU_ITEMS_CACHE_TIMEOUT)
+        return items
+
     def can_user_delete(self, user):
-        if not self.owner or self.owner == user:
+        # Compare IDs so that checking a whole page of stores does not load
+        # each owner. has_perm() results are cached per user (see
+        # base.backends).
+        if not self.owner_id or self.owner_id == user.pk:
             return True
         if user.has_perm('stores.delete_store'):
             return True
         return False
 
 
-class MenuItem(models.Model):
+class MenuItem(LoadedValuesMixin, models.Model):
 
     store = models.ForeignKey(
         'Store', related_name='menu_items', verbose_name=_('store'),
@@ -46,6 +94,9 @@ class MenuItem(models.Model):
     price = models.IntegerField(
         verbose_name=_('price'),
     )
+    updated_at = models.DateTimeField(
+        auto_now=True, verbose_name=_('updated at'),
+    )
 
     class Meta:
         verbose_name = _('Menu item')
@@ -53,3 +104,47 @@ class MenuItem(models.Model):
 
     def __str__(self):
         return self.name
+
+
+# Sent once after menu items of a store were created or updated in bulk,
+# which skips post_save. price_changes maps the primary key of each updated
+# item whose price changed to its (previous, new) price.
+menu_items_bulk_saved = Signal(providing_args=['store', 'price_changes'])
+
+# Sent before menu items of a store are deleted in bulk, which skips
+# pre_delete and post_delete and does not cascade, so that receivers can
+# delete what refers to them. pks lists the primary keys of the items.
+# Receivers may return a function to call once the deletion is committed.
+menu_items_bulk_deleting = Signal(providing_args=['store', 'pks', 'using'])
+
+
+def touch_store(store_pk, **counters):
+    # A store's version covers its menu items. The counters are updated in
+    # the same statement, with F() so that concurrent writers do not
+    # overwrite each other's changes.
+    Store.objects.filter(pk=store_pk).update(
+        updated_at=timezone.now(), **counters
+    )
+
+
+@receiver(post_save, sender=MenuItem)
+def count_saved_menu_item(sender, instance, created, **kwargs):
+    previous_store_pk = instance._loaded_values.get('store_id')
+    if created:
+        touch_store(
+            instance.store_id, menu_item_count=F('menu_item_count') + 1,
+        )
+    elif previous_store_pk not in (None, instance.store_id):
+        touch_store(
+            previous_store_pk, menu_item_count=F('menu_item_count') - 1,
+        )
+        touch_store(
+            instance.store_id, menu_item_count=F('menu_item_count') + 1,
+        )
+    else:
+        touch_store(instance.store_id)
+
+
+@receiver(post_delete, sender=MenuItem)
+def count_deleted_menu_item(sender, instance, **kwargs):
+    touch_store(instance.store_id, menu_item_count=F('menu_item_count') - 1)
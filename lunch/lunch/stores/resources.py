@@ -1,8 +1,24 @@
-from tastypie import authentication, authorization, fields, resources
+from django.conf.urls import url
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+from tastypie import authentication, authorization, fields, http, resources
+from tastypie.constants import ALL
+from tastypie.exceptions import ImmediateHttpResponse
+from tastypie.utils import trailing_slash
 
+from .bulk import BulkError, apply_operations
+
+from .conditional import store_etag, store_last_modified, store_list_etag
 from .models import Store, MenuItem
 
 
+BULK_PERMISSIONS = {
+    'create': 'stores.add_menuitem',
+    'update': 'stores.change_menuitem',
+    'delete': 'stores.delete_menuitem',
+}
+
+
 class ReadOnlyAuthentication(authentication.Authentication):
     def is_authenticated(self, request, **kwargs):
         if request.method.lower() == 'get':
@@ -23,14 +39,75 @@ class StoreResource(resources.ModelResource):
     )
 
     class Meta:
-        queryset = Store.objects.all()
+        # Load the menu items of a whole page in one query; ToManyField
+        # builds the nested bundles from the prefetched items.
+        queryset = Store.objects.prefetch_related('menu_items')
         resource_name = 'store'
+        filtering = {'menu_item_count': ALL}
+        ordering = ('id', 'menu_item_count',)
         authentication = authentication.MultiAuthentication(
             ReadOnlyAuthentication(),
             authentication.SessionAuthentication(),
         )
         authorization = authorization.DjangoAuthorization()
 
+    def prepend_urls(self):
+        return [
+            url(
+                r'^(?P<resource_name>{name})/(?P<pk>\d+)/menu_items{slash}$'
+                .format(name=self._meta.resource_name, slash=trailing_slash()),
+                self.wrap_view('bulk_menu_items'),
+                name='api_store_bulk_menu_items',
+            ),
+        ]
+
+    def bulk_menu_items(self, request, pk, **kwargs):
+        """Create, update and delete menu items of a store at once.
+
+        Takes a list of operations (see stores.bulk). Needs the same
+        permissions as the operations on MenuItemResource.
+        """
+        self.method_check(request, allowed=['post'])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+        operations = self.deserialize(
+            request, request.body,
+            format=request.META.get('CONTENT_TYPE', 'application/json'),
+        )
+        if isinstance(operations, list):
+            permissions = {
+                BULK_PERMISSIONS[operation.get('action')]
+                for operation in operations
+                if isinstance(operation, dict) and
+                operation.get('action') in BULK_PERMISSIONS
+            }
+            if not request.user.has_perms(permissions):
+                raise ImmediateHttpResponse(http.HttpUnauthorized())
+        try:
+            store = Store.objects.get(pk=pk)
+        except Store.DoesNotExist:
+            raise ImmediateHttpResponse(http.HttpNotFound())
+        try:
+            results, applied = apply_operations(store, operations)
+        except BulkError as e:
+            raise ImmediateHttpResponse(http.HttpBadRequest(str(e)))
+        self.log_throttled_access(request)
+        return self.create_response(
+            request, {'results': results}, response_class=(
+                HttpResponse if applied else http.HttpBadRequest
+            ),
+        )
+
+    def get_list(self, request, **kwargs):
+        view = condition(etag_func=store_list_etag)(super().get_list)
+        return view(request, **kwargs)
+
+    def get_detail(self, request, **kwargs):
+        view = condition(
+            etag_func=store_etag, last_modified_func=store_last_modified,
+        )(super().get_detail)
+        return view(request, **kwargs)
+
 
 class MenuItemResource(resources.ModelResource):
     class Meta:
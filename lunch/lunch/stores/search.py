@@ -0,0 +1,203 @@
+"""Ranked search over store names, notes and menu item names.
+
+Stores whose name matches rank first, then stores with a matching menu
+item, then those with matching notes; closer matches rank higher within
+each group. Matching is by substring, which also works for Chinese names
+without word segmentation.
+
+PostgreSQL uses pg_trgm GIN indexes, and SQLite FTS5 tables with the
+trigram tokenizer (kept in sync by triggers). Both are created by
+migration 0006; other databases fall back to unindexed ``icontains``.
+"""
+from django.db import connections
+from django.db.models import Q
+
+from .models import Store
+
+
+SEARCH_LIMIT = 50
+
+# Trigram indexes cannot look up shorter strings.
+MIN_INDEXED_LENGTH = 3
+
+NAME_WEIGHT = 2
+MENU_ITEM_WEIGHT = 1
+NOTES_WEIGHT = 0.5
+
+POSTGRESQL_INDEXES = (
+    ('stores_store_name_trgm', 'stores_store', 'name'),
+    ('stores_store_notes_trgm', 'stores_store', 'notes'),
+    ('stores_menuitem_name_trgm', 'stores_menuitem', 'name'),
+)
+
+POSTGRESQL_SEARCH_SQL = """
+    SELECT store_id, MAX(score) AS score FROM (
+        SELECT id AS store_id, %(name)s + similarity(name, %%s) AS score
+        FROM stores_store WHERE name ILIKE %%s
+        UNION ALL
+        SELECT store_id, %(item)s + similarity(name, %%s)
+        FROM stores_menuitem WHERE name ILIKE %%s
+        UNION ALL
+        SELECT id, %(notes)s + similarity(notes, %%s)
+        FROM stores_store WHERE notes ILIKE %%s
+    ) AS matches
+    GROUP BY store_id ORDER BY score DESC, store_id LIMIT %%s
+""" % {'name': NAME_WEIGHT, 'item': MENU_ITEM_WEIGHT, 'notes': NOTES_WEIGHT}
+
+# The share of the text that the query covers stands in for similarity().
+SQLITE_SEARCH_SQL = """
+    SELECT store_id, MAX(score) AS score FROM (
+        SELECT rowid AS store_id,
+            %(name)s + length(%%s) * 1.0 / length(name) AS score
+        FROM stores_store_fts WHERE name MATCH %%s
+        UNION ALL
+        SELECT store_id, %(item)s + length(%%s) * 1.0 / length(name)
+        FROM stores_menuitem_fts WHERE name MATCH %%s
+        UNION ALL
+        SELECT rowid, %(notes)s + length(%%s) * 1.0 / length(notes)
+        FROM stores_store_fts WHERE notes MATCH %%s
+    )
+    GROUP BY store_id ORDER BY score DESC, store_id LIMIT %%s
+""" % {'name': NAME_WEIGHT, 'item': MENU_ITEM_WEIGHT, 'notes': NOTES_WEIGHT}
+
+# Short queries scan the tables, as the trigram index cannot help.
+SQLITE_SCAN_SQL = """
+    SELECT store_id, MAX(score) AS score FROM (
+        SELECT id AS store_id,
+            %(name)s + length(%%s) * 1.0 / length(name) AS score
+        FROM stores_store WHERE name LIKE %%s ESCAPE '\\'
+        UNION ALL
+        SELECT store_id, %(item)s + length(%%s) * 1.0 / length(name)
+        FROM stores_menuitem WHERE name LIKE %%s ESCAPE '\\'
+        UNION ALL
+        SELECT id, %(notes)s + length(%%s) * 1.0 / length(notes)
+        FROM stores_store WHERE notes LIKE %%s ESCAPE '\\'
+    )
+    GROUP BY store_id ORDER BY score DESC, store_id LIMIT %%s
+""" % {'name': NAME_WEIGHT, 'item': MENU_ITEM_WEIGHT, 'notes': NOTES_WEIGHT}
+
+SQLITE_FTS_TABLES = (
+    # (FTS table, table, copied columns, FTS column definitions)
+    ('stores_store_fts', 'stores_store', 'name, notes', 'name, notes'),
+    ('stores_menuitem_fts', 'stores_menuitem', 'name, store_id',
+     'name, store_id UNINDEXED'),
+)
+
+
+def escape_like(query):
+    return (
+        query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    )
+
+
+def has_sqlite_fts(connection):
+    # The trigram tokenizer was added in SQLite 3.34.
+    return (
+        connection.vendor == 'sqlite' and
+        connection.Database.sqlite_version_info >= (3, 34, 0)
+    )
+
+
+def create_search_index(schema_editor):
+    """Create the search index for the database, replacing any existing one.
+
+    Called by migrations. On SQLite, run it again after a migration remakes
+    stores_store or stores_menuitem, since that drops the triggers.
+    """
+    connection = schema_editor.connection
+    drop_search_index(schema_editor)
+    if connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name, table, column in POSTGRESQL_INDEXES:
+            schema_editor.execute(
+                'CREATE INDEX {name} ON {table} '
+                'USING gin ({column} gin_trgm_ops)'.format(
+                    name=name, table=table, column=column,
+                )
+            )
+    elif has_sqlite_fts(connection):
+        for fts_table, table, columns, definition in SQLITE_FTS_TABLES:
+            context = {
+                'fts_table': fts_table, 'table': table, 'columns': columns,
+                'definition': definition,
+                'values': ', '.join(
+                    'new.' + column for column in columns.split(', ')
+                ),
+            }
+            for sql in (
+                "CREATE VIRTUAL TABLE {fts_table} "
+                "USING fts5({definition}, tokenize='trigram')",
+                "INSERT INTO {fts_table}(rowid, {columns}) "
+                "SELECT id, {columns} FROM {table}",
+                "CREATE TRIGGER {fts_table}_insert AFTER INSERT ON {table} "
+                "BEGIN INSERT INTO {fts_table}(rowid, {columns}) "
+                "VALUES (new.id, {values}); END",
+                "CREATE TRIGGER {fts_table}_update "
+                "AFTER UPDATE OF {columns} ON {table} "
+                "BEGIN DELETE FROM {fts_table} WHERE rowid = old.id; "
+                "INSERT INTO {fts_table}(rowid, {columns}) "
+                "VALUES (new.id, {values}); END",
+                "CREATE TRIGGER {fts_table}_delete AFTER DELETE ON {table} "
+                "BEGIN DELETE FROM {fts_table} WHERE rowid = old.id; END",
+            ):
+                schema_editor.execute(sql.format(**context))
+
+
+def drop_search_index(schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        for name, table, column in POSTGRESQL_INDEXES:
+            schema_editor.execute('DROP INDEX IF EXISTS {}'.format(name))
+    elif has_sqlite_fts(connection):
+        for fts_table, table, columns, definition in SQLITE_FTS_TABLES:
+            for action in ('insert', 'update', 'delete'):
+                schema_editor.execute(
+                    'DROP TRIGGER IF EXISTS {}_{}'.format(fts_table, action),
+                )
+            schema_editor.execute('DROP TABLE IF EXISTS {}'.format(fts_table))
+
+
+def get_ranked_store_pks(query, limit=SEARCH_LIMIT, using='default'):
+    """Return ``[(store_pk, score), ...]``, best match first."""
+    connection = connections[using]
+    pattern = '%' + escape_like(query) + '%'
+    if connection.vendor == 'postgresql':
+        sql = POSTGRESQL_SEARCH_SQL
+        params = [query, pattern] * 3
+    elif has_sqlite_fts(connection) and len(query) >= MIN_INDEXED_LENGTH:
+        sql = SQLITE_SEARCH_SQL
+        phrase = '"{}"'.format(query.replace('"', '""'))
+        params = [query, phrase] * 3
+    elif connection.vendor == 'sqlite':
+        sql = SQLITE_SCAN_SQL
+        params = [query, pattern] * 3
+    else:
+        stores = Store.objects.using(using).filter(
+            Q(name__icontains=query) | Q(notes__icontains=query) |
+            Q(menu_items__name__icontains=query)
+        ).distinct().order_by('name')
+        return [(pk, 0) for pk in stores.values_list('pk', flat=True)[:limit]]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+def search_stores(query, queryset=None, limit=SEARCH_LIMIT):
+    """Return stores matching ``query``, best match first.
+
+    Each store gets a ``search_score`` attribute. Pass ``queryset`` to
+    select or prefetch related objects.
+    """
+    query = query.strip()
+    if not query:
+        return []
+    if queryset is None:
+        queryset = Store.objects.all()
+    ranked = get_ranked_store_pks(query, limit=limit, using=queryset.db)
+    stores = queryset.in_bulk([pk for pk, score in ranked])
+    results = []
+    for pk, score in ranked:
+        if pk in stores:
+            stores[pk].search_score = score
+            results.append(stores[pk])
+    return results
@@ -1,6 +1,24 @@
+import io
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.urlresolvers import reverse
+from django.core.management import call_command
+from django.db import connection, reset_queries
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
+from .api import StorePagination
+from .bulk import apply_operations, insert_items
+from .menu_import import ImportReport, MenuImportError, import_menu, iter_rows
 from .models import MenuItem, Store
+from .search import search_stores
+from .views import MENU_ITEM_PAGE_SIZE, STORE_LIST_PAGE_SIZE
 
 
 class StoreViewTests(TestCase):
@@ -28,3 +46,773 @@ class StoreViewTests(TestCase):
             response, '<tr><td>大麥克餐</td><td>99</td></tr>',
             html=True,
         )
+
+
+class StoreListPaginationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', password='pw')
+        self.user = User.objects.create_user(username='user', password='pw')
+        Store.objects.bulk_create([
+            Store(name='Store {}'.format(i), owner=self.owner)
+            for i in range(STORE_LIST_PAGE_SIZE * 2 + 5)
+        ])
+        self.pks = list(Store.objects.order_by('pk').values_list(
+            'pk', flat=True,
+        ))
+
+    def test_first_page(self):
+        r = self.client.get('/store/')
+        self.assertEqual(len(r.context['stores']), STORE_LIST_PAGE_SIZE)
+        self.assertIsNone(r.context['previous_cursor'])
+        self.assertEqual(
+            r.context['next_cursor'], self.pks[STORE_LIST_PAGE_SIZE - 1],
+        )
+
+    def test_walk_pages(self):
+        seen = []
+        cursor = None
+        while True:
+            url = '/store/'
+            if cursor is not None:
+                url += '?after={}'.format(cursor)
+            r = self.client.get(url)
+            seen.extend(store.pk for store in r.context['stores'])
+            cursor = r.context['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.pks)
+
+    def test_previous_page(self):
+        after = self.pks[STORE_LIST_PAGE_SIZE - 1]
+        r = self.client.get('/store/?after={}'.format(after))
+        r = self.client.get(
+            '/store/?before={}'.format(r.context['previous_cursor']),
+        )
+        self.assertEqual(
+            [store.pk for store in r.context['stores']],
+            self.pks[:STORE_LIST_PAGE_SIZE],
+        )
+        self.assertIsNone(r.context['previous_cursor'])
+
+    def test_invalid_cursor(self):
+        r = self.client.get('/store/?after=foo')
+        self.assertEqual(r.status_code, 404)
+
+    def test_query_count_does_not_grow(self):
+        self.client.login(username='user', password='pw')
+        # User, stores, user permissions, group permissions.
+        with self.assertNumQueries(4):
+            self.client.get('/store/')
+        Store.objects.bulk_create([
+            Store(name='More {}'.format(i), owner=self.owner)
+            for i in range(50)
+        ])
+        # Permissions are cached now.
+        with self.assertNumQueries(2):
+            self.client.get('/store/?after={}'.format(self.pks[-1]))
+
+
+class StoreAPITests(TestCase):
+
+    def setUp(self):
+        stores = [Store(name='Store {}'.format(i)) for i in range(60)]
+        Store.objects.bulk_create(stores)
+        MenuItem.objects.bulk_create([
+            MenuItem(store=store, name='Item {}'.format(i), price=i)
+            for store in Store.objects.all() for i in range(3)
+        ])
+
+    def test_list_query_count(self):
+        # ETag, stores, menu items.
+        with self.assertNumQueries(3):
+            r = self.client.get('/api/v1/store/')
+        self.assertEqual(len(r.data['results']), StorePagination.page_size)
+        self.assertEqual(len(r.data['results'][0]['menu_items']), 3)
+        self.assertEqual(
+            set(r.data['results'][0]['menu_items'][0]), {'name', 'price'},
+        )
+
+    def test_cursor(self):
+        r = self.client.get('/api/v1/store/')
+        self.assertIsNone(r.data['previous'])
+        r = self.client.get(r.data['next'])
+        self.assertEqual(
+            len(r.data['results']),
+            Store.objects.count() - StorePagination.page_size,
+        )
+        self.assertIsNone(r.data['next'])
+
+    def test_sparse_fields_with_menu_items(self):
+        r = self.client.get('/api/v1/store/?fields=id,menu_items')
+        self.assertEqual(set(r.data['results'][0]), {'id', 'menu_items'})
+        self.assertEqual(
+            set(r.data['results'][0]['menu_items'][0]), {'name', 'price'},
+        )
+
+    def test_sparse_fields(self):
+        with self.assertNumQueries(2):
+            r = self.client.get('/api/v1/store/?fields=id,name')
+        self.assertEqual(set(r.data['results'][0]), {'id', 'name'})
+
+
+class StoreResourceTests(TestCase):
+
+    def setUp(self):
+        Store.objects.bulk_create([
+            Store(name='Store {}'.format(i)) for i in range(30)
+        ])
+        MenuItem.objects.bulk_create([
+            MenuItem(store=store, name='Item {}'.format(i), price=i)
+            for store in Store.objects.all() for i in range(3)
+        ])
+
+    def test_list_query_count(self):
+        # ETag, count, stores, menu items.
+        with self.assertNumQueries(4):
+            r = self.client.get('/api/v2/store/')
+        objects = json.loads(r.content.decode('utf-8'))['objects']
+        self.assertEqual(len(objects[-1]['menu_items']), 3)
+        self.assertEqual(objects[-1]['menu_items'][0]['name'], 'Item 0')
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.store = Store.objects.create(name='McDonalds')
+        self.item = MenuItem.objects.create(
+            store=self.store, name='大麥克餐', price=99,
+        )
+
+    def assertNotModified(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 304)
+
+    def assertModified(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+
+    def test_detail_view(self):
+        url = self.store.get_absolute_url()
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, HTTP_IF_NONE_MATCH=etag)
+        self.item.price = 109
+        self.item.save()
+        self.assertModified(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_api_detail(self):
+        url = '/api/v1/store/{}/'.format(self.store.pk)
+        response = self.client.get(url)
+        self.assertNotModified(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertNotModified(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertModified(url + '?fields=name',
+                            HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_api_list(self):
+        for url in ('/api/v1/store/', '/api/v2/store/'):
+            etag = self.client.get(url)['ETag']
+            self.assertNotModified(url, HTTP_IF_NONE_MATCH=etag)
+            store = Store.objects.create(name='肯德基')
+            self.assertModified(url, HTTP_IF_NONE_MATCH=etag)
+            etag = self.client.get(url)['ETag']
+            store.delete()
+            self.assertModified(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_v2_detail(self):
+        url = '/api/v2/store/{}/'.format(self.store.pk)
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, HTTP_IF_NONE_MATCH=etag)
+        self.item.delete()
+        self.assertModified(url, HTTP_IF_NONE_MATCH=etag)
+
+
+class FragmentCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username='owner', password='pw')
+        User.objects.create_user(username='user', password='pw')
+        self.store = Store.objects.create(name='McDonalds', owner=self.owner)
+        self.item = MenuItem.objects.create(
+            store=self.store, name='大麥克餐', price=99,
+        )
+        self.url = self.store.get_absolute_url()
+
+    def get_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_menu_cached(self):
+        self.get_queries(self.url)
+        response, queries = self.get_queries(self.url)
+        self.assertContains(
+            response, '<tr><td>大麥克餐</td><td>99</td></tr>', html=True,
+        )
+        self.assertFalse([sql for sql in queries if 'stores_menuitem' in sql])
+
+    def test_menu_invalidated(self):
+        self.client.get(self.url)
+        self.item.price = 109
+        self.item.save()
+        response = self.client.get(self.url)
+        self.assertContains(
+            response, '<tr><td>大麥克餐</td><td>109</td></tr>', html=True,
+        )
+
+    def test_delete_button_per_user(self):
+        delete_button = (
+            '<button type="submit" class="btn btn-danger">刪除</button>'
+        )
+        self.client.login(username='owner', password='pw')
+        self.assertContains(
+            self.client.get(self.url), delete_button, html=True,
+        )
+        self.client.login(username='user', password='pw')
+        self.assertNotContains(
+            self.client.get(self.url), delete_button, html=True,
+        )
+
+    def test_list_invalidated(self):
+        delete_url = reverse('store_delete', kwargs={'pk': self.store.pk})
+        self.client.login(username='owner', password='pw')
+        response = self.client.get('/store/')
+        self.assertContains(response, delete_url)
+        self.store.name = 'Burger King'
+        self.store.save()
+        self.client.login(username='user', password='pw')
+        response = self.client.get('/store/')
+        self.assertContains(response, 'Burger King')
+        self.assertNotContains(response, delete_url)
+
+
+class MenuItemsCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.store = Store.objects.create(name='McDonalds')
+        self.item = MenuItem.objects.create(
+            store=self.store, name='大麥克餐', price=99,
+        )
+
+    def get_menu_items(self):
+        return Store.objects.get(pk=self.store.pk).get_menu_items()
+
+    def test_cached(self):
+        store = Store.objects.get(pk=self.store.pk)
+        self.assertEqual(store.get_menu_items(), [self.item])
+        with self.assertNumQueries(0):
+            self.assertEqual(store.get_menu_items(), [self.item])
+
+    def test_new_version(self):
+        self.get_menu_items()
+        self.item.price = 109
+        self.item.save()
+        self.assertEqual(self.get_menu_items()[0].price, 109)
+        apply_operations(self.store, [
+            {'action': 'create', 'name': '薯條', 'price': 35},
+        ])
+        self.assertEqual(
+            [item.name for item in self.get_menu_items()], ['大麥克餐', '薯條'],
+        )
+        self.item.delete()
+        self.assertEqual(
+            [item.name for item in self.get_menu_items()], ['薯條'],
+        )
+
+
+class StoreSearchTests(TestCase):
+
+    def setUp(self):
+        self.notes_match = Store.objects.create(
+            name='點水樓', notes='隔壁有賣小籠包',
+        )
+        self.item_match = Store.objects.create(name='京鼎樓')
+        self.item = MenuItem.objects.create(
+            store=self.item_match, name='蟹粉小籠包', price=280,
+        )
+        self.name_match = Store.objects.create(name='小籠包專賣店')
+
+    def search(self, query):
+        return [store.pk for store in search_stores(query)]
+
+    def test_ranking(self):
+        self.assertEqual(self.search('小籠包'), [
+            self.name_match.pk, self.item_match.pk, self.notes_match.pk,
+        ])
+
+    def test_short_query(self):
+        self.assertEqual(self.search('蟹'), [self.item_match.pk])
+
+    def test_case_insensitive(self):
+        store = Store.objects.create(name='Din Tai Fung')
+        self.assertEqual(self.search('tai fung'), [store.pk])
+
+    def test_no_wildcards(self):
+        self.assertEqual(self.search('%'), [])
+        self.assertEqual(self.search('  '), [])
+
+    def test_index_updated(self):
+        self.item.name = '排骨蛋炒飯'
+        self.item.save()
+        self.assertEqual(self.search('炒飯'), [self.item_match.pk])
+        self.assertNotIn(self.item_match.pk, self.search('小籠包'))
+        self.name_match.delete()
+        self.assertEqual(self.search('小籠包'), [self.notes_match.pk])
+
+    def test_view(self):
+        response = self.client.get('/store/search/', {'q': '蟹粉'})
+        self.assertContains(
+            response,
+            '<a href="/store/{}/">京鼎樓</a>'.format(self.item_match.pk),
+            html=True,
+        )
+        response = self.client.get('/store/search/', {'q': '披薩'})
+        self.assertContains(response, '找不到符合「披薩」的店家。')
+
+    def test_api(self):
+        r = self.client.get('/api/v1/store/', {'q': '小籠包', 'fields': 'id'})
+        self.assertEqual(json.loads(r.content.decode('utf-8'))['results'], [
+            {'id': self.name_match.pk}, {'id': self.item_match.pk},
+            {'id': self.notes_match.pk},
+        ])
+
+
+class MenuItemCountTests(TestCase):
+
+    def setUp(self):
+        # Remove the stores created by migrations, to list only these.
+        Store.objects.all().delete()
+        self.store = Store.objects.create(name='McDonalds')
+        self.other = Store.objects.create(name='肯德基')
+
+    def get_count(self, store):
+        return Store.objects.get(pk=store.pk).menu_item_count
+
+    def test_create_and_delete(self):
+        item = MenuItem.objects.create(
+            store=self.store, name='大麥克餐', price=99,
+        )
+        MenuItem.objects.create(store=self.store, name='薯條', price=35)
+        self.assertEqual(self.get_count(self.store), 2)
+        item.delete()
+        self.assertEqual(self.get_count(self.store), 1)
+
+    def test_stale_save(self):
+        store = Store.objects.get(pk=self.store.pk)
+        MenuItem.objects.create(store=self.store, name='大麥克餐', price=99)
+        store.notes = '24 小時營業'
+        store.save()
+        store = Store.objects.get(pk=self.store.pk)
+        self.assertEqual(store.notes, '24 小時營業')
+        self.assertEqual(store.menu_item_count, 1)
+
+    def test_move(self):
+        MenuItem.objects.create(store=self.store, name='大麥克餐', price=99)
+        item = MenuItem.objects.get()
+        item.store = self.other
+        item.save()
+        self.assertEqual(self.get_count(self.store), 0)
+        self.assertEqual(self.get_count(self.other), 1)
+
+    def test_repair_command(self):
+        MenuItem.objects.bulk_create([
+            MenuItem(store=self.store, name='大麥克餐', price=99),
+            MenuItem(store=self.store, name='薯條', price=35),
+        ])
+        self.assertEqual(self.get_count(self.store), 0)
+        out = io.StringIO()
+        call_command('repair_counters', stdout=out)
+        self.assertEqual(self.get_count(self.store), 2)
+        self.assertIn('1 stores', out.getvalue())
+
+    def test_api(self):
+        MenuItem.objects.create(store=self.other, name='咔啦雞腿堡', price=69)
+        response = self.client.get(
+            '/api/v1/store/?ordering=-menu_item_count&fields=id',
+        )
+        self.assertEqual(
+            [store['id'] for store in response.data['results']],
+            [self.other.pk, self.store.pk],
+        )
+        response = self.client.get('/api/v1/store/?min_menu_items=1&fields=id')
+        self.assertEqual(response.data['results'], [{'id': self.other.pk}])
+        response = self.client.get('/api/v1/store/?min_menu_items=x')
+        self.assertEqual(response.status_code, 400)
+
+    def test_v2_filter(self):
+        MenuItem.objects.create(store=self.other, name='咔啦雞腿堡', price=69)
+        response = self.client.get(
+            '/api/v2/store/?menu_item_count__gte=1&format=json',
+        )
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(
+            [store['name'] for store in data['objects']], ['肯德基'],
+        )
+
+
+class MenuItemBulkTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='pw')
+        self.client.login(username='user', password='pw')
+        self.store = Store.objects.create(name='McDonalds')
+        self.big_mac = MenuItem.objects.create(
+            store=self.store, name='大麥克餐', price=99,
+        )
+        self.cone = MenuItem.objects.create(
+            store=self.store, name='蛋捲冰淇淋', price=15,
+        )
+        self.url = '/api/v1/store/{}/menu_items/'.format(self.store.pk)
+
+    def post(self, url, operations):
+        return self.client.post(
+            url, json.dumps(operations), content_type='application/json',
+        )
+
+    def get_menu(self):
+        return sorted(self.store.menu_items.values_list('name', 'price'))
+
+    def test_apply(self):
+        response = self.post(self.url, [
+            {'action': 'create', 'name': '薯條', 'price': 35},
+            {'action': 'update', 'id': self.big_mac.pk, 'price': 109},
+            {'action': 'delete', 'id': self.cone.pk},
+            {'action': 'create', 'name': '可樂', 'price': 25},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(results[1], {
+            'action': 'update', 'id': self.big_mac.pk,
+            'name': '大麥克餐', 'price': 109,
+        })
+        self.assertEqual(results[2], {'action': 'delete', 'id': self.cone.pk})
+        self.assertEqual(
+            MenuItem.objects.get(pk=results[3]['id']).name, '可樂',
+        )
+        self.assertEqual(self.get_menu(), [
+            ('可樂', 25), ('大麥克餐', 109), ('薯條', 35),
+        ])
+        store = Store.objects.get(pk=self.store.pk)
+        self.assertEqual(store.menu_item_count, 3)
+        self.assertGreater(store.updated_at, self.store.updated_at)
+        self.assertEqual(search_stores('薯條'), [store])
+
+    def test_query_count_does_not_grow(self):
+        def count_queries(n):
+            operations = [
+                {'action': 'create', 'name': 'Item {}'.format(i), 'price': i}
+                for i in range(n)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post(self.url, operations)
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        self.assertEqual(count_queries(50), count_queries(5))
+
+    def test_insert_items(self):
+        items = [
+            MenuItem(store=self.store, name=name, price=price)
+            for name, price in [('可樂', 25), ('薯條', 35), ('可樂', 25),
+                                ('可樂', 30)]
+        ]
+        insert_items(items, 'default')
+        self.assertEqual(len({item.pk for item in items}), 4)
+        for item in items:
+            self.assertEqual(
+                self.store.menu_items.filter(
+                    pk=item.pk, name=item.name, price=item.price,
+                ).count(),
+                1,
+            )
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'Needs SQLite.')
+    def test_sqlite_without_returning(self):
+        # SQLite before 3.35 has no RETURNING.
+        with mock.patch.object(
+                connection.Database, 'sqlite_version_info', (3, 31, 1),
+        ):
+            response = self.post(self.url, [
+                {'action': 'create', 'name': '薯條', 'price': 35},
+                {'action': 'delete', 'id': self.cone.pk},
+            ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_menu(), [('大麥克餐', 99), ('薯條', 35)])
+
+    def test_invalid(self):
+        other = MenuItem.objects.create(
+            store=Store.objects.create(name='肯德基'), name='蛋塔', price=35,
+        )
+        response = self.post(self.url, [
+            {'action': 'create', 'name': '薯條', 'price': 35},
+            {'action': 'create', 'name': '可樂'},
+            {'action': 'update', 'id': other.pk, 'price': 1},
+            {'action': 'delete', 'id': self.cone.pk},
+            {'action': 'update', 'id': self.cone.pk, 'price': 1},
+            {'action': 'rename'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = [
+            set(result.get('errors', ()))
+            for result in response.data['results']
+        ]
+        self.assertEqual(
+            errors, [set(), {'price'}, {'id'}, set(), {'id'}, {'action'}],
+        )
+        self.assertEqual(self.get_menu(), [('大麥克餐', 99), ('蛋捲冰淇淋', 15)])
+        self.assertEqual(self.post(self.url, {}).status_code, 400)
+
+    def test_v1_needs_login(self):
+        self.client.logout()
+        response = self.post(self.url, [{'action': 'delete', 'id': 1}])
+        self.assertEqual(response.status_code, 403)
+
+    def test_v2(self):
+        url = '/api/v2/store/{}/menu_items/'.format(self.store.pk)
+        operations = [
+            {'action': 'create', 'name': '薯條', 'price': 35},
+            {'action': 'delete', 'id': self.cone.pk},
+        ]
+        self.assertEqual(self.post(url, operations).status_code, 401)
+        self.user.user_permissions.add(*Permission.objects.filter(
+            codename__in=['add_menuitem', 'delete_menuitem'],
+        ))
+        response = self.post(url, operations)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(
+            [result['action'] for result in data['results']],
+            ['create', 'delete'],
+        )
+        self.assertEqual(self.get_menu(), [('大麥克餐', 99), ('薯條', 35)])
+
+
+class MenuImportTests(TestCase):
+
+    def setUp(self):
+        self.store = Store.objects.create(name='McDonalds')
+        self.big_mac = MenuItem.objects.create(
+            store=self.store, name='大麥克餐', price=99,
+        )
+        MenuItem.objects.create(store=self.store, name='蛋捲冰淇淋', price=15)
+        MenuItem.objects.create(store=self.store, name='奶昔', price=40)
+
+    def import_csv(self, content, **kwargs):
+        rows = iter_rows(io.BytesIO(content.encode('utf-8-sig')), 'csv')
+        return import_menu(self.store, rows, **kwargs)
+
+    def get_menu(self):
+        return sorted(self.store.menu_items.values_list('name', 'price'))
+
+    def test_import(self):
+        report = self.import_csv(
+            '品項,單價\n大麥克餐,109\n奶昔,40\n\n薯條,35\n"可樂, 大杯",30\n',
+            batch_size=1,
+        )
+        self.assertEqual(report, ImportReport(
+            created=2, updated=1, deleted=1, unchanged=1,
+        ))
+        self.assertEqual(self.get_menu(), [
+            ('可樂, 大杯', 30), ('大麥克餐', 109), ('奶昔', 40), ('薯條', 35),
+        ])
+        self.assertEqual(
+            self.store.menu_items.get(name='大麥克餐'), self.big_mac,
+        )
+        self.assertEqual(
+            Store.objects.get(pk=self.store.pk).menu_item_count, 4,
+        )
+
+    def test_keep_missing(self):
+        report = self.import_csv(
+            'price,name\n35,薯條\n', keep_missing=True,
+        )
+        self.assertEqual(report, ImportReport(1, 0, 0, 0))
+        self.assertEqual(len(self.get_menu()), 4)
+
+    def test_invalid(self):
+        menu = self.get_menu()
+        with self.assertRaises(MenuImportError) as cm:
+            self.import_csv('品項,單價\n薯條,35\n可樂,大杯\n薯條,30\n,10\n')
+        self.assertEqual(
+            [error.split(':')[0] for error in cm.exception.errors],
+            ['Line 3', 'Line 4', 'Line 5'],
+        )
+        self.assertEqual(self.get_menu(), menu)
+        with self.assertRaises(MenuImportError):
+            self.import_csv('品名,價格\n薯條,35\n')
+
+    def test_dry_run(self):
+        menu = self.get_menu()
+        report = self.import_csv('name,price\n薯條,35\n', dry_run=True)
+        self.assertEqual(report, ImportReport(1, 0, 3, 0))
+        self.assertEqual(self.get_menu(), menu)
+
+    def test_query_count_does_not_grow(self):
+        def count_queries(prefix, n):
+            content = 'name,price\n' + ''.join(
+                '{} {},{}\n'.format(prefix, i, i) for i in range(n)
+            )
+            with CaptureQueriesContext(connection) as queries:
+                self.import_csv(content, keep_missing=True, batch_size=100)
+            return len(queries)
+
+        self.assertEqual(count_queries('A', 90), count_queries('B', 5))
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+            f.write('name,price\n大麥克餐,109\n'.encode('utf-8'))
+            f.flush()
+            stdout = io.StringIO()
+            call_command(
+                'import_menu', str(self.store.pk), f.name, '--keep-missing',
+                stdout=stdout,
+            )
+        self.assertIn('0 created, 1 updated, 0 deleted', stdout.getvalue())
+        self.assertEqual(len(self.get_menu()), 3)
+
+    def test_view(self):
+        User.objects.create_user(username='user', password='pw')
+        self.client.login(username='user', password='pw')
+        url = reverse('store_import', kwargs={'pk': self.store.pk})
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.post(url, {'file': SimpleUploadedFile(
+            'menu.csv', '品項,單價\n薯條,35\n'.encode('utf-8'),
+        )})
+        self.assertEqual(response.context['report'], (1, 0, 3, 0))
+        self.assertEqual(self.get_menu(), [('薯條', 35)])
+        response = self.client.post(url, {'file': SimpleUploadedFile(
+            'menu.txt', b'name,price\n',
+        )})
+        self.assertIsNone(response.context['report'])
+        self.assertTrue(response.context['form'].errors)
+
+    def test_view_unreadable_csv(self):
+        User.objects.create_user(username='user', password='pw')
+        self.client.login(username='user', password='pw')
+        url = reverse('store_import', kwargs={'pk': self.store.pk})
+        menu = self.get_menu()
+        for content, error in [
+                ('品項,單價\n薯條,35\n'.encode('big5'), 'UTF-8'),
+                ('name,price\n薯條,35\n可樂\0,25\n'.encode('utf-8'),
+                 'Line 3')]:
+            response = self.client.post(url, {'file': SimpleUploadedFile(
+                'menu.csv', content,
+            )})
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response.context['report'])
+            self.assertIn(error, response.context['form'].errors['file'][0])
+        self.assertEqual(self.get_menu(), menu)
+
+
+class StoreUpdateTests(TestCase):
+
+    def setUp(self):
+        self.store = Store.objects.create(name='McDonalds')
+        self.items = [
+            MenuItem.objects.create(
+                store=self.store, name='Item {}'.format(i), price=i,
+            )
+            for i in range(MENU_ITEM_PAGE_SIZE + 5)
+        ]
+        self.url = reverse('store_update', kwargs={'pk': self.store.pk})
+
+    def get_data(self, items, extra=()):
+        data = {
+            'name': self.store.name, 'notes': '',
+            'menu_items-INITIAL_FORMS': len(items),
+            'menu_items-TOTAL_FORMS': len(items) + len(extra),
+        }
+        for i, item in enumerate(list(items) + list(extra)):
+            data.update({
+                'menu_items-{}-{}'.format(i, key): value
+                for key, value in item.items()
+            })
+        return data
+
+    def test_pages(self):
+        response = self.client.get(self.url)
+        formset = response.context['menu_item_formset']
+        self.assertEqual(
+            [form.instance for form in formset.initial_forms],
+            self.items[:MENU_ITEM_PAGE_SIZE],
+        )
+        response = self.client.get(self.url, {
+            'after': response.context['next_cursor'],
+        })
+        formset = response.context['menu_item_formset']
+        self.assertEqual(
+            [form.instance for form in formset.initial_forms],
+            self.items[MENU_ITEM_PAGE_SIZE:],
+        )
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_save_changed_rows(self):
+        page = [
+            {'id': item.pk, 'name': item.name, 'price': item.price}
+            for item in self.items[MENU_ITEM_PAGE_SIZE:]
+        ]
+        page[0]['price'] = 100
+        page[1]['DELETE'] = 'on'
+        # The query log is cleared when the request starts.
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, self.get_data(
+                page, extra=[{'name': '薯條', 'price': 35}, {}],
+            ))
+        updates = [
+            query for query in queries
+            if 'UPDATE "stores_menuitem"' in query['sql']
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertRedirects(response, self.store.get_absolute_url())
+        self.assertEqual(MenuItem.objects.get(pk=page[0]['id']).price, 100)
+        self.assertFalse(MenuItem.objects.filter(pk=page[1]['id']).exists())
+        self.assertTrue(self.store.menu_items.filter(name='薯條').exists())
+        self.assertEqual(
+            Store.objects.get(pk=self.store.pk).menu_item_count,
+            len(self.items),
+        )
+
+    def test_delete_rows_query_count(self):
+        def count_queries(items):
+            page = [
+                {'id': item.pk, 'name': item.name, 'price': item.price,
+                 'DELETE': 'on'}
+                for item in items
+            ]
+            reset_queries()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, self.get_data(page))
+            # Read the queries before the redirect clears the log.
+            sql = [query['sql'] for query in queries]
+            self.assertRedirects(response, self.store.get_absolute_url())
+            self.assertEqual(
+                len([s for s in sql if 'DELETE FROM "stores_menuitem"' in s]),
+                1,
+            )
+            return len(sql)
+
+        self.assertEqual(
+            count_queries(self.items[2:7]), count_queries(self.items[:2]),
+        )
+        self.assertEqual(
+            list(self.store.menu_items.all()), self.items[7:],
+        )
+        self.assertEqual(
+            Store.objects.get(pk=self.store.pk).menu_item_count,
+            len(self.items) - 7,
+        )
+
+    def test_deleted_row(self):
+        item = self.items[0]
+        data = self.get_data([
+            {'id': item.pk, 'name': item.name, 'price': 100},
+        ])
+        item.delete()
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['menu_item_formset'].is_valid())
@@ -2,23 +2,87 @@ import logging
 
 from django.contrib.auth.decorators import login_required
 from django.core.urlresolvers import reverse
+from django.db import transaction
 from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django.shortcuts import redirect, render
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import condition, require_http_methods
 
 from events.forms import EventForm
-from .forms import MenuItemFormSet, StoreForm
-from .models import Store
+from .bulk import apply_operations
+from .conditional import store_page_etag
+from .forms import MenuImportForm, MenuItemFormSet, StoreForm
+from .menu_import import MenuImportError, get_format, import_menu, iter_rows
+from .models import MenuItem, Store
+from .search import search_stores
 
 
 logger = logging.getLogger(__name__)
 
+STORE_LIST_PAGE_SIZE = 20
+
+MENU_ITEM_PAGE_SIZE = 50
+
+
+def get_cursor(request, key):
+    value = request.GET.get(key)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise Http404
+
+
+def paginate_by_pk(queryset, after=None, before=None,
+                   size=STORE_LIST_PAGE_SIZE):
+    """Keyset pagination on primary key.
+
+    Returns ``(objects, previous_cursor, next_cursor)``. Pass
+    ``previous_cursor`` as ``before`` and ``next_cursor`` as ``after`` to
+    fetch neighbouring pages. A cursor is ``None`` if there is no such page.
+    """
+    if before is not None:
+        objects = list(
+            queryset.filter(pk__lt=before).order_by('-pk')[:size + 1]
+        )
+        has_previous = len(objects) > size
+        objects = objects[:size][::-1]
+        has_next = True
+    else:
+        queryset = queryset.order_by('pk')
+        if after is not None:
+            queryset = queryset.filter(pk__gt=after)
+        objects = list(queryset[:size + 1])
+        has_next = len(objects) > size
+        objects = objects[:size]
+        has_previous = after is not None
+    if not objects:
+        return objects, None, None
+    previous_cursor = objects[0].pk if has_previous else None
+    next_cursor = objects[-1].pk if has_next else None
+    return objects, previous_cursor, next_cursor
+
 
 def store_list(request):
-    stores = Store.objects.all()
-    return render(request, 'stores/store_list.html', {'stores': stores})
+    stores, previous_cursor, next_cursor = paginate_by_pk(
+        Store.objects.all(),
+        after=get_cursor(request, 'after'),
+        before=get_cursor(request, 'before'),
+    )
+    return render(request, 'stores/store_list.html', {
+        'stores': stores,
+        'previous_cursor': previous_cursor, 'next_cursor': next_cursor,
+    })
+
+
+def store_search(request):
+    query = request.GET.get('q', '')
+    return render(request, 'stores/store_search.html', {
+        'query': query, 'stores': search_stores(query),
+    })
 
 
+@condition(etag_func=store_page_etag)
 def store_detail(request, pk):
     try:
         store = Store.objects.get(pk=pk)
@@ -54,20 +118,78 @@ def store_update(request, pk):
     except Store.DoesNotExist:
         raise Http404
 
+    # Only one page of menu items is edited at a time, and only the changed
+    # rows are written, in bulk.
+    previous_cursor = next_cursor = None
     if request.method == 'POST':
         form = StoreForm(request.POST, instance=store, submit_title='更新')
         menu_item_formset = MenuItemFormSet(request.POST, instance=store)
         if form.is_valid() and menu_item_formset.is_valid():
-            store = form.save()
-            menu_item_formset.save()
-            return redirect(store.get_absolute_url())
+            with transaction.atomic():
+                store = form.save()
+                _, applied = apply_operations(
+                    store, menu_item_formset.get_operations(),
+                )
+                if not applied:
+                    transaction.set_rollback(True)
+            if applied:
+                return redirect(store.get_absolute_url())
+            form.add_error(None, '菜單已被其他人修改，請重新載入後再試一次。')
     else:
         form = StoreForm(instance=store, submit_title=None)
         form.helper.form_tag = False
-        menu_item_formset = MenuItemFormSet(instance=store)
+        menu_items, previous_cursor, next_cursor = paginate_by_pk(
+            store.menu_items.all(),
+            after=get_cursor(request, 'after'),
+            before=get_cursor(request, 'before'),
+            size=MENU_ITEM_PAGE_SIZE,
+        )
+        menu_item_formset = MenuItemFormSet(
+            instance=store, queryset=MenuItem.objects.filter(
+                pk__in=[item.pk for item in menu_items],
+            ),
+        )
 
     return render(request, 'stores/store_update.html', {
         'form': form, 'store': store, 'menu_item_formset': menu_item_formset,
+        'previous_cursor': previous_cursor, 'next_cursor': next_cursor,
+    })
+
+
+@login_required
+def store_import(request, pk):
+    try:
+        store = Store.objects.get(pk=pk)
+    except Store.DoesNotExist:
+        raise Http404
+
+    report = None
+    if request.method == 'POST':
+        form = MenuImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            file = form.cleaned_data['file']
+            format = get_format(file.name)
+            if format is None:
+                form.add_error('file', '請上傳 CSV 或 XLSX 檔案。')
+            else:
+                try:
+                    report = import_menu(
+                        store, iter_rows(file, format),
+                        keep_missing=form.cleaned_data['keep_missing'],
+                    )
+                except MenuImportError as e:
+                    for error in e.errors:
+                        form.add_error('file', error)
+                else:
+                    logger.info(
+                        'Menu of {store} imported by {user}: {report}'.format(
+                            store=store, user=request.user, report=report,
+                        )
+                    )
+    else:
+        form = MenuImportForm()
+    return render(request, 'stores/store_import.html', {
+        'form': form, 'store': store, 'report': report,
     })
 
 